@@ -1,11 +1,16 @@
 import threading
 import time
+from collections import deque
 from datetime import datetime, timedelta
 import logging
-import requests
+import os
+import sys
 import tkinter as tk
 from tkinter import scrolledtext
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python'))
+from lib.controller_workers import DashboardPublisher, DeferredScheduler
+
 
 class TerminalGUI:
     def __init__(self, root):
@@ -68,11 +73,19 @@ class TerminalGUI:
 
 
 class CentralController:
-    def __init__(self, terminal_gui):
+    def __init__(self, terminal_gui, max_log_size=None, dashboard_url='http://localhost:5000/update'):
         self.terminal_gui = terminal_gui
-        self.message_log = []
+        self.message_log = deque()  # (arrival time, message) in arrival order, only those that arrived within the time window are kept
+        self.max_log_size = max_log_size  # Optional hard limit on the number of logged messages
+        self.expired_messages = 0  # Messages evicted from the log after leaving the time window
+        self.dropped_messages = 0  # Messages evicted from the log because of max_log_size
         self.lock = threading.Lock()
         self.onboarded_xapps = set()  # Track onboarded xApps
+        self.time_window = timedelta(seconds=5)  # Define the short time frame for conflict detection
+        self.intent_index = {}  # (e2_node_id, ue_id) -> {xapp_id: latest message of the xApp for this target}
+        self.xapp_targets = {}  # xapp_id -> set of (e2_node_id, ue_id) the xApp has an indexed message for
+        self.dashboard = DashboardPublisher(dashboard_url)
+        self.scheduler = DeferredScheduler()  # Executes the buffered messages
         logging.basicConfig(filename='central_controller.log', level=logging.INFO, format='%(asctime)s - %(message)s')
 
     def onboard_xapp(self, xapp_id):
@@ -91,61 +104,121 @@ class CentralController:
             print(message)
             self.terminal_gui.append_text(message)  # Print to terminal GUI
 
-            self.message_log.append({
+            new_msg = {
                 'xapp_id': xapp_id,
                 'e2_node_id': e2_node_id,
                 'ue_id': ue_id,
                 'min_prb_ratio': min_prb_ratio,
                 'max_prb_ratio': max_prb_ratio,
                 'timestamp': timestamp
-            })
+            }
+            # Evict by arrival time, the xApp's timestamp may be skewed
+            received = datetime.now()
+            self.message_log.append((received, new_msg))
+            self.evict_messages(received)
 
             # Detect conflicts whenever a new message is logged
-            self.detect_conflict()
+            self.detect_conflict(new_msg)
 
     def detect_conflict_onboarding(self, new_xapp_id):
-        """Check for conflicts immediately after onboarding a new xApp."""
+        """Check for conflicts immediately after onboarding a new xApp and return all detected conflicts."""
         message = f"Checking for conflicts upon onboarding xApp {new_xapp_id}"
         print(message)
         self.terminal_gui.append_text(message)  # Print to terminal GUI
 
-        # Check if there are any existing messages from other xApps
-        for message in self.message_log:
-            if message['xapp_id'] != new_xapp_id:
-                for onboarded_xapp_id in self.onboarded_xapps:
-                    if onboarded_xapp_id != new_xapp_id:
-                        existing_messages = [msg for msg in self.message_log if msg['xapp_id'] == onboarded_xapp_id]
-                        for existing_msg in existing_messages:
-                            if self.is_conflict(existing_msg, message):
-                                conflict_msg = f"Conflict detected between messages from  {existing_msg['xapp_id']} and  {message['xapp_id']}"
-                                print(conflict_msg)
-                                self.terminal_gui.append_text(conflict_msg)  # Print to terminal GUI
-                                logging.info(conflict_msg)
-                                self.notify_dashboard(conflict_msg)
-                                self.resolve_conflict(existing_msg, message)
-                                return  # Resolve the first detected conflict and exit
-
-    def detect_conflict(self):
-        """Detect conflicts based on recent messages."""
         current_time = datetime.now()
-        time_window = timedelta(seconds=5)  # Define the short time frame for conflict detection
-        recent_messages = [msg for msg in self.message_log if current_time - msg['timestamp'] <= time_window]
-
-        message = f"Checking for conflicts among {len(recent_messages)} recent messages"
+        self.evict_messages(current_time)
+
+        # Only the targets the new xApp has recent messages for can conflict, so look them up in the index
+        conflicts = []
+        for target in self.xapp_targets.get(new_xapp_id, ()):
+            intents = self.intent_index[target]
+            message = intents[new_xapp_id]
+            if current_time - message['timestamp'] > self.time_window:
+                continue
+            for xapp_id, existing_msg in intents.items():
+                if (xapp_id != new_xapp_id and xapp_id in self.onboarded_xapps and
+                        current_time - existing_msg['timestamp'] <= self.time_window and self.is_conflict(existing_msg, message)):
+                    conflicts.append((existing_msg, message))
+
+        for existing_msg, message in conflicts:
+            conflict_msg = f"Conflict detected between messages from  {existing_msg['xapp_id']} and  {message['xapp_id']}"
+            print(conflict_msg)
+            self.terminal_gui.append_text(conflict_msg)  # Print to terminal GUI
+            logging.info(conflict_msg)
+            self.notify_dashboard(conflict_msg)
+            self.resolve_conflict(existing_msg, message)
+        return conflicts
+
+    def detect_conflict(self, new_msg):
+        """Detect conflicts between a new message and the latest recent messages of the other xApps for the same target."""
+        current_time = datetime.now()
+        if current_time - new_msg['timestamp'] > self.time_window:
+            return
+
+        # Only messages for the same e2_node_id and ue_id can conflict, so look them up in the index
+        # instead of comparing all recent messages pairwise
+        target = (new_msg['e2_node_id'], new_msg['ue_id'])
+        for xapp_id, msg in list(self.intent_index.get(target, {}).items()):
+            if current_time - msg['timestamp'] > self.time_window:
+                self.drop_intent(target, xapp_id)
+        intents = self.intent_index.setdefault(target, {})
+        latest_msg = intents.get(new_msg['xapp_id'], None)
+        if latest_msg is None or latest_msg['timestamp'] <= new_msg['timestamp']:
+            intents[new_msg['xapp_id']] = new_msg
+            self.xapp_targets.setdefault(new_msg['xapp_id'], set()).add(target)
+        recent_messages = [msg for xapp_id, msg in intents.items() if xapp_id != new_msg['xapp_id']]
+
+        message = f"Checking for conflicts among {len(recent_messages) + 1} recent messages for e2_node_id {new_msg['e2_node_id']} and ue_id {new_msg['ue_id']}"
         print(message)
         self.terminal_gui.append_text(message)  # Print to terminal GUI
 
-        if len(recent_messages) > 1:
-            for i in range(len(recent_messages)):
-                for j in range(i + 1, len(recent_messages)):
-                    if self.is_conflict(recent_messages[i], recent_messages[j]):
-                        conflict_msg = f"Conflict detected between messages from  {recent_messages[i]['xapp_id']} and  {recent_messages[j]['xapp_id']}"
-                        print(conflict_msg)
-                        self.terminal_gui.append_text(conflict_msg)  # Print to terminal GUI
-                        logging.info(conflict_msg)
-                        self.notify_dashboard(conflict_msg)
-                        self.resolve_conflict(recent_messages[i], recent_messages[j])
-                        return  # Resolve the first detected conflict and exit
+        for existing_msg in recent_messages:
+            if self.is_conflict(existing_msg, new_msg):
+                conflict_msg = f"Conflict detected between messages from  {existing_msg['xapp_id']} and  {new_msg['xapp_id']}"
+                print(conflict_msg)
+                self.terminal_gui.append_text(conflict_msg)  # Print to terminal GUI
+                logging.info(conflict_msg)
+                self.notify_dashboard(conflict_msg)
+                self.resolve_conflict(existing_msg, new_msg)
+                return  # Resolve the first detected conflict and exit
+
+    def evict_messages(self, current_time):
+        """Remove messages that arrived before the time window, or the oldest ones beyond max_log_size, from the log and the index."""
+        while self.message_log and current_time - self.message_log[0][0] > self.time_window:
+            self.forget_message(self.message_log.popleft()[1])
+            self.expired_messages += 1
+        while self.max_log_size is not None and len(self.message_log) > self.max_log_size:
+            self.forget_message(self.message_log.popleft()[1])
+            self.dropped_messages += 1
+
+    def forget_message(self, msg):
+        """Remove a message from the intent index unless a newer message of the xApp replaced it."""
+        target = (msg['e2_node_id'], msg['ue_id'])
+        intents = self.intent_index.get(target, None)
+        if intents is not None and intents.get(msg['xapp_id'], None) is msg:
+            self.drop_intent(target, msg['xapp_id'])
+
+    def drop_intent(self, target, xapp_id):
+        """Remove the indexed message of an xApp for a target."""
+        intents = self.intent_index[target]
+        del intents[xapp_id]
+        if not intents:
+            del self.intent_index[target]
+        targets = self.xapp_targets[xapp_id]
+        targets.discard(target)
+        if not targets:
+            del self.xapp_targets[xapp_id]
+
+    def get_log_stats(self):
+        """Return the size of the message log and the intent index and the eviction counters."""
+        with self.lock:
+            return {
+                'logged_messages': len(self.message_log),
+                'indexed_targets': len(self.intent_index),
+                'expired_messages': self.expired_messages,
+                'dropped_messages': self.dropped_messages
+            }
 
     def is_conflict(self, msg1, msg2):
         """Detect conflicts when messages have different PRB allocations for the same e2_node_id and ue_id."""
@@ -182,8 +255,8 @@ class CentralController:
         self.terminal_gui.append_text(message)  # Print to terminal GUI
         logging.info(message)
 
-        # Schedule execution after 20 seconds
-        threading.Timer(5, self.execute_buffered_message, [msg]).start()
+        # Schedule execution after 5 seconds, replacing a still buffered message of the xApp for the same target
+        self.scheduler.schedule(5, self.execute_buffered_message, [msg], key=(msg['xapp_id'], msg['e2_node_id'], msg['ue_id']))
 
     def execute_buffered_message(self, msg):
         """Execute a buffered message after the delay."""
@@ -193,14 +266,13 @@ class CentralController:
         logging.info(message)
         self.apply_message(msg)
 
+    def cancel_buffered_message(self, xapp_id, e2_node_id, ue_id):
+        """Cancel the buffered message of an xApp for a target, returns False if there is none."""
+        return self.scheduler.cancel((xapp_id, e2_node_id, ue_id))
+
     def notify_dashboard(self, message):
-        """Notify the dashboard with a message."""
-        try:
-            requests.post('http://localhost:5000/update', json={'message': message})
-        except Exception as e:
-            error_message = f"  "
-            print(error_message)
-            self.terminal_gui.append_text(error_message)  # Print to terminal GUI
+        """Notify the dashboard with a message, sent in the background by the dashboard publisher."""
+        self.dashboard.publish(message)
 
 
 def start_controller(terminal_gui):
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# Per-message cost of CentralController.log_message with N intents in the conflict detection window,
+# for the indexed detection vs. the previous scan of the whole message log with pairwise comparison.
+# The controller's prints are redirected to /dev/null and the conflict log is disabled.
+
+import os
+import sys
+import time
+import logging
+import argparse
+import contextlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+logging.basicConfig(handlers=[logging.NullHandler()])
+from central_controller_latest import CentralController
+
+
+class LegacyCentralController(CentralController):
+    # detect_conflict before the intent index: all recent messages, compared pairwise
+    def detect_conflict(self, new_msg):
+        current_time = datetime.now()
+        recent_messages = [msg for _, msg in self.message_log if current_time - msg['timestamp'] <= self.time_window]
+        print(f"Checking for conflicts among {len(recent_messages)} recent messages")
+        for i in range(len(recent_messages)):
+            for j in range(i + 1, len(recent_messages)):
+                if self.is_conflict(recent_messages[i], recent_messages[j]):
+                    return
+
+
+def measure(controller, num_intents, num_messages):
+    # Two xApps agreeing on the PRB ratios of every target, so the window is full of intents but without conflicts
+    for i in range(num_intents):
+        controller.log_message('xApp{}'.format(1 + i % 2), 'gnb_{:03d}'.format(i % 100), i // 2, 1, 5, datetime.now())
+    start = time.perf_counter()
+    for i in range(num_messages):
+        controller.log_message('xApp3', 'gnb_{:03d}'.format(i % 100), i, 1, 5, datetime.now())
+    return (time.perf_counter() - start) / num_messages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Conflict detection scaling benchmark')
+    parser.add_argument("--intents", type=int, nargs='+', default=[10, 100, 1000, 10000, 100000], help="Numbers of intents in the window")
+    parser.add_argument("--messages", type=int, default=1000, help="Number of measured messages per run")
+    parser.add_argument("--legacy_max", type=int, default=1000, help="Largest number of intents to measure the pairwise scan with")
+    args = parser.parse_args()
+
+    print("{:>8s} {:>14s} {:>14s}".format("intents", "indexed [us]", "pairwise [us]"))
+    for num_intents in args.intents:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            indexed = measure(CentralController(), num_intents, args.messages)
+            legacy = None
+            if num_intents <= args.legacy_max:
+                legacy = measure(LegacyCentralController(), num_intents, max(1, args.messages // 10))
+        print("{:8d} {:14.1f} {:>14s}".format(num_intents, indexed * 1e6, "-" if legacy is None else "{:.1f}".format(legacy * 1e6)))
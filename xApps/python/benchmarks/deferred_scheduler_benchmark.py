@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# Schedules N deferred calls on the central controller's DeferredScheduler (one thread, heap) and on
+# one threading.Timer per call as buffer_message did before, and reports scheduling time, threads,
+# peak memory and lateness. Every 10th call is superseded and every 10th is cancelled again.
+
+import os
+import sys
+import time
+import argparse
+import resource
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.controller_workers import DeferredScheduler
+
+
+class Completion(object):
+    def __init__(self, expected):
+        super(Completion, self).__init__()
+        self.expected = expected
+        self.count = 0
+        self.lateness = []
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+    def __call__(self, due_time):
+        lateness = time.monotonic() - due_time
+        with self.lock:
+            self.count += 1
+            self.lateness.append(lateness)
+            if self.count == self.expected:
+                self.done.set()
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_scheduler(num_calls, spread):
+    scheduler = DeferredScheduler()
+    completion = Completion(num_calls - num_calls // 10)
+    start = time.perf_counter()
+    for i in range(num_calls):
+        delay = 0.5 + spread * i / num_calls
+        scheduler.schedule(delay, completion, [time.monotonic() + delay], key=i)
+        if i % 10 == 1:
+            # supersede the call of the previous message
+            delay += 0.01
+            scheduler.schedule(delay, completion, [time.monotonic() + delay], key=i - 1)
+        elif i % 10 == 2:
+            scheduler.cancel(i)
+    schedule_time = time.perf_counter() - start
+    threads = threading.active_count()
+    completion.done.wait(spread + 30)
+    stats = scheduler.get_stats()
+    scheduler.stop()
+    print("DeferredScheduler: {} calls scheduled in {:.2f} s, {} threads, {} executed, {} superseded, {} cancelled, "
+          "lateness mean {:.1f} ms max {:.1f} ms, max RSS {:.0f} MB".format(
+              num_calls, schedule_time, threads, stats['executed'], stats['superseded'], stats['cancelled'],
+              stats['mean_lateness'] * 1e3, stats['max_lateness'] * 1e3, max_rss_mb()))
+
+
+def run_timers(num_calls, spread):
+    completion = Completion(num_calls)
+    start = time.perf_counter()
+    for i in range(num_calls):
+        delay = 0.5 + spread * i / num_calls
+        threading.Timer(delay, completion, [time.monotonic() + delay]).start()
+    schedule_time = time.perf_counter() - start
+    threads = threading.active_count()
+    completion.done.wait(spread + 30)
+    print("threading.Timer:   {} calls scheduled in {:.2f} s, {} threads, {} executed, "
+          "lateness mean {:.1f} ms max {:.1f} ms, max RSS {:.0f} MB".format(
+              num_calls, schedule_time, threads, completion.count,
+              sum(completion.lateness) * 1e3 / max(1, len(completion.lateness)), max(completion.lateness, default=0) * 1e3, max_rss_mb()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Deferred message scheduler benchmark')
+    parser.add_argument("--calls", type=int, default=100000, help="Number of deferred calls on the scheduler")
+    parser.add_argument("--timers", type=int, default=2000, help="Number of threading.Timer calls to compare with, 0 to skip")
+    parser.add_argument("--spread", type=float, default=2.0, help="Due times are spread over this many seconds")
+    args = parser.parse_args()
+
+    # the scheduler first, the peak RSS only grows
+    run_scheduler(args.calls, args.spread)
+    if args.timers > 0:
+        run_timers(args.timers, args.spread)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Measures E2SM-KPM indication decode throughput, in-process asn1tools vs. KpmDecodePool with N worker processes.
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.asn1.e2sm_kpm_packer import e2sm_kpm_packer
+from lib.kpm_decode_pool import KpmDecodePool
+
+
+def build_indication(packer, num_ues, metric_names):
+    # E2SM-KPM Indication Header Format 1 + Indication Message Format 3 (UE-level measurements)
+    indication_hdr = {'colletStartTime': (3930000000 << 32).to_bytes(8, 'big')}
+    indication_hdr = packer.asn1_compiler.encode('E2SM-KPM-IndicationHeader-Format1', indication_hdr)
+
+    meas_info_list = [{'measType': ('measName', name), 'labelInfoList': [{'measLabel': {'noLabel': 'true'}}]} for name in metric_names]
+    ue_reports = []
+    for ue_id in range(num_ues):
+        ue_reports.append({'ueID': ('gNB-DU-UEID', {'gNB-CU-UE-F1AP-ID': ue_id}),
+                           'measReport': {'measData': [{'measRecord': [('integer', ue_id * 10 + i) for i in range(len(metric_names))]}],
+                                          'measInfoList': meas_info_list,
+                                          'granulPeriod': 1000}})
+    indication_msg = {'indicationMessage-formats': ('indicationMessage-Format3', {'ueMeasReportList': ue_reports})}
+    indication_msg = packer.asn1_compiler.encode('E2SM-KPM-IndicationMessage', indication_msg)
+    return indication_hdr, indication_msg
+
+
+def run_inline(packer, indications):
+    start = time.perf_counter()
+    for e2_node_id, indication_hdr, indication_msg in indications:
+        packer.unpack_indication_header(indication_hdr)
+        packer.unpack_indication_message(indication_msg)
+    return time.perf_counter() - start
+
+
+def run_pool(num_workers, indications):
+    pool = KpmDecodePool(num_workers, max_pending=len(indications))
+    # warm up every shard, so process start-up and codec compilation are not measured
+    for shard_key in range(num_workers * 4):
+        pool.decode(shard_key, indications[0][1], indications[0][2])
+
+    start = time.perf_counter()
+    futures = [pool.submit(e2_node_id, indication_hdr, indication_msg) for e2_node_id, indication_hdr, indication_msg in indications]
+    for future in futures:
+        future.result()
+    duration = time.perf_counter() - start
+    pool.shutdown()
+    return duration
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='E2SM-KPM decoding throughput benchmark')
+    parser.add_argument("--indications", type=int, default=2000, help="Number of decoded indications per run")
+    parser.add_argument("--e2_nodes", type=int, default=64, help="Number of E2 nodes (shard keys)")
+    parser.add_argument("--ues", type=int, default=8, help="Number of UEs per indication")
+    parser.add_argument("--max_workers", type=int, default=os.cpu_count() or 1, help="Maximum number of decoder processes")
+    args = parser.parse_args()
+
+    packer = e2sm_kpm_packer()
+    indication_hdr, indication_msg = build_indication(packer, args.ues, ['DRB.UEThpDl', 'DRB.UEThpUl'])
+    indications = [('gnbd_{:03d}'.format(i % args.e2_nodes), indication_hdr, indication_msg) for i in range(args.indications)]
+
+    duration = run_inline(packer, indications)
+    print("inline:    {:8.0f} indications/s".format(len(indications) / duration))
+
+    num_workers = 1
+    while num_workers <= args.max_workers:
+        duration = run_pool(num_workers, indications)
+        print("{:2d} worker(s): {:8.0f} indications/s".format(num_workers, len(indications) / duration))
+        num_workers *= 2
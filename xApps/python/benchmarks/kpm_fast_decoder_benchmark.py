@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# Checks the hand-written E2SM-KPM indication decoder against asn1tools on a random corpus and
+# measures the per-indication decode time of both.
+
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.asn1.e2sm_kpm_packer import e2sm_kpm_packer
+from lib.asn1 import e2sm_kpm_fast_decoder
+
+METRIC_NAMES = ['DRB.UEThpDl', 'DRB.UEThpUl', 'RRU.PrbUsedDl', 'RRU.PrbUsedUl', 'DRB.RlcSduDelayDl']
+
+
+def random_record_item(rnd):
+    choice = rnd.random()
+    if choice < 0.6:
+        return ('integer', rnd.choice([0, rnd.randint(0, 255), rnd.randint(0, 65535), rnd.randint(0, 4294967295)]))
+    if choice < 0.9:
+        return ('real', rnd.choice([0.0, -1.5, rnd.uniform(-1e6, 1e6), rnd.uniform(0, 1)]))
+    return ('noValue', None)
+
+
+def random_label(rnd):
+    if rnd.random() < 0.9:
+        return {'measLabel': {'noLabel': 'true'}}
+    # not supported by the fast decoder
+    return {'measLabel': {'fiveQI': rnd.randint(0, 255)}}
+
+
+def random_format1(rnd, num_metrics):
+    metric_names = rnd.sample(METRIC_NAMES, num_metrics)
+    meas_data = []
+    for _ in range(rnd.randint(1, 4)):
+        meas_data_item = {'measRecord': [random_record_item(rnd) for _ in metric_names]}
+        if rnd.random() < 0.1:
+            meas_data_item['incompleteFlag'] = 'true'
+        meas_data.append(meas_data_item)
+    content = {'measData': meas_data}
+    if rnd.random() < 0.9:
+        meas_info_list = []
+        for metric_name in metric_names:
+            meas_type = ('measName', metric_name) if rnd.random() < 0.9 else ('measID', rnd.randint(1, 65536))
+            meas_info_list.append({'measType': meas_type, 'labelInfoList': [random_label(rnd) for _ in range(rnd.randint(1, 2))]})
+        content['measInfoList'] = meas_info_list
+    if rnd.random() < 0.9:
+        content['granulPeriod'] = rnd.choice([1, 100, 1000, rnd.randint(1, 4294967295)])
+    return content
+
+
+def random_ue_id(rnd):
+    choice = rnd.random()
+    if choice < 0.7:
+        ue_id = {'gNB-CU-UE-F1AP-ID': rnd.randint(0, 4294967295)}
+        if rnd.random() < 0.2:
+            ue_id['ran-UEID'] = bytes(rnd.randint(0, 255) for _ in range(8))
+        return ('gNB-DU-UEID', ue_id)
+    if choice < 0.9:
+        return ('gNB-CU-UP-UEID', {'gNB-CU-CP-UE-E1AP-ID': rnd.randint(0, 4294967295)})
+    # not supported by the fast decoder
+    return ('eNB-UEID', {'mME-UE-S1AP-ID': rnd.randint(0, 4294967295),
+                         'gUMMEI': {'pLMN-Identity': b'\x00\xf1\x10', 'mME-Group-ID': b'\x00\x01', 'mME-Code': b'\x01'}})
+
+
+def random_indication_message(rnd):
+    if rnd.random() < 0.5:
+        return {'indicationMessage-formats': ('indicationMessage-Format1', random_format1(rnd, rnd.randint(1, 3)))}
+    num_metrics = rnd.randint(1, 3)
+    ue_reports = [{'ueID': random_ue_id(rnd), 'measReport': random_format1(rnd, num_metrics)} for _ in range(rnd.randint(1, 8))]
+    return {'indicationMessage-formats': ('indicationMessage-Format3', {'ueMeasReportList': ue_reports})}
+
+
+def check_corpus(packer, num_messages, seed):
+    rnd = random.Random(seed)
+    fast_decoded = 0
+    for idx in range(num_messages):
+        indication_msg = packer.asn1_compiler.encode('E2SM-KPM-IndicationMessage', random_indication_message(rnd))
+        expected = packer.asn1_compiler.decode('E2SM-KPM-IndicationMessage', indication_msg)
+        try:
+            decoded = e2sm_kpm_fast_decoder.decode_indication_message(indication_msg)
+        except e2sm_kpm_fast_decoder.UnsupportedEncoding:
+            # must still decode correctly through the packer's fallback
+            decoded = packer.unpack_indication_message(indication_msg)
+        else:
+            fast_decoded += 1
+        if decoded != expected:
+            print("Mismatch for message {}: {}".format(idx, indication_msg.hex()))
+            print("  asn1tools: {}".format(expected))
+            print("  fast:      {}".format(decoded))
+            return False
+
+    for collet_start_time in [bytes(8), b'\xff' * 8, (3930000000 << 32).to_bytes(8, 'big')]:
+        indication_hdr = packer.asn1_compiler.encode('E2SM-KPM-IndicationHeader-Format1', {'colletStartTime': collet_start_time})
+        if e2sm_kpm_fast_decoder.decode_indication_header_format1(indication_hdr) != packer.asn1_compiler.decode('E2SM-KPM-IndicationHeader-Format1', indication_hdr):
+            print("Mismatch for indication header: {}".format(indication_hdr.hex()))
+            return False
+
+    print("corpus check passed: {} messages, {} decoded by the fast decoder".format(num_messages, fast_decoded))
+    return True
+
+
+def measure(decode_func, indication_msgs, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for indication_msg in indication_msgs:
+            decode_func(indication_msg)
+    return (time.perf_counter() - start) / (repeat * len(indication_msgs))
+
+
+def build_typical_indication(packer, num_ues, metric_names):
+    ue_reports = []
+    for ue_id in range(num_ues):
+        ue_reports.append({'ueID': ('gNB-DU-UEID', {'gNB-CU-UE-F1AP-ID': ue_id}),
+                           'measReport': {'measData': [{'measRecord': [('integer', ue_id * 10 + i) for i in range(len(metric_names))]}],
+                                          'measInfoList': [{'measType': ('measName', name), 'labelInfoList': [{'measLabel': {'noLabel': 'true'}}]} for name in metric_names],
+                                          'granulPeriod': 1000}})
+    format3 = {'indicationMessage-formats': ('indicationMessage-Format3', {'ueMeasReportList': ue_reports})}
+    format1 = {'indicationMessage-formats': ('indicationMessage-Format1', ue_reports[0]['measReport'])}
+    return (packer.asn1_compiler.encode('E2SM-KPM-IndicationMessage', format1),
+            packer.asn1_compiler.encode('E2SM-KPM-IndicationMessage', format3))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='E2SM-KPM fast decoder check and benchmark')
+    parser.add_argument("--corpus", type=int, default=2000, help="Number of random messages in the differential check")
+    parser.add_argument("--seed", type=int, default=1, help="Seed of the random corpus")
+    parser.add_argument("--ues", type=int, default=16, help="Number of UEs in the Format 3 benchmark message")
+    parser.add_argument("--repeat", type=int, default=200, help="Number of decodes per measurement")
+    args = parser.parse_args()
+
+    packer = e2sm_kpm_packer()
+    if not check_corpus(packer, args.corpus, args.seed):
+        sys.exit(1)
+
+    format1_msg, format3_msg = build_typical_indication(packer, args.ues, ['DRB.UEThpDl', 'DRB.UEThpUl'])
+    for name, indication_msg in [('Format 1', format1_msg), ('Format 3 ({} UEs)'.format(args.ues), format3_msg)]:
+        generic = measure(lambda msg: packer.asn1_compiler.decode('E2SM-KPM-IndicationMessage', msg), [indication_msg], args.repeat)
+        fast = measure(e2sm_kpm_fast_decoder.decode_indication_message, [indication_msg], args.repeat)
+        print("{:20s} asn1tools: {:8.1f} us, fast: {:8.1f} us, speedup: {:5.1f}x".format(name, generic * 1e6, fast * 1e6, generic / fast))
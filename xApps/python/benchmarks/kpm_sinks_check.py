@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Feeds E2SM-KPM Format 1 and Format 3 indications with noValue measurement records through KpmMeasStore
+# (float and integer dtype) and KpmAggregator, decoded by the fast decoder and by asn1tools, and checks that
+# noValue samples are skipped without losing the other samples of the indication. Requires numpy.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.asn1.e2sm_kpm_packer import e2sm_kpm_packer
+from lib.e2sm_kpm_module import collet_start_time_ms
+from lib.kpm_meas_store import KpmMeasStore
+from lib.kpm_aggregates import KpmAggregator
+
+GRANUL_PERIOD = 1000
+
+
+def meas_report(records_a, records_b):
+    return {'measData': [{'measRecord': [a, b]} for a, b in zip(records_a, records_b)],
+            'measInfoList': [{'measType': ('measName', name), 'labelInfoList': [{'measLabel': {'noLabel': 'true'}}]} for name in ['A', 'B']],
+            'granulPeriod': GRANUL_PERIOD}
+
+
+def build_indications(packer):
+    no_value = ('noValue', None)
+    format1 = {'indicationMessage-formats': ('indicationMessage-Format1',
+               meas_report([('integer', 5), ('integer', 6)], [no_value, ('integer', 2)]))}
+    format3 = {'indicationMessage-formats': ('indicationMessage-Format3', {'ueMeasReportList': [
+               {'ueID': ('gNB-DU-UEID', {'gNB-CU-UE-F1AP-ID': 7}), 'measReport': meas_report([no_value, no_value], [('integer', 3), no_value])},
+               {'ueID': ('gNB-DU-UEID', {'gNB-CU-UE-F1AP-ID': 8}), 'measReport': meas_report([('integer', 9), ('integer', 10)], [('integer', 4), ('integer', 1)])}]})}
+    indication_hdr = packer.asn1_compiler.encode('E2SM-KPM-IndicationHeader-Format1', {'colletStartTime': (3930000000 << 32).to_bytes(8, 'big')})
+    return indication_hdr, [packer.asn1_compiler.encode('E2SM-KPM-IndicationMessage', msg) for msg in [format1, format3]]
+
+
+# (ue_id, metric_name) -> [(sample index, value)] of the valid samples
+EXPECTED = {
+    (None, 'A'): [(0, 5), (1, 6)],
+    (None, 'B'): [(1, 2)],
+    (7, 'A'): [],
+    (7, 'B'): [(0, 3)],
+    (8, 'A'): [(0, 9), (1, 10)],
+    (8, 'B'): [(0, 4), (1, 1)],
+}
+
+
+def check(packer, fast_decode):
+    packer.fast_decode = fast_decode
+    indication_hdr, indication_msgs = build_indications(packer)
+    hdr = packer.unpack_indication_header(indication_hdr)
+    start_ms = collet_start_time_ms(hdr)
+    stores = [KpmMeasStore(capacity=16, dtype='float64'), KpmMeasStore(capacity=16, dtype='int64')]
+    aggregator = KpmAggregator()
+    for indication_msg in indication_msgs:
+        msg = packer.unpack_indication_message(indication_msg)
+        for sink in stores + [aggregator]:
+            sink.on_indication('gnb', 'sub', hdr, msg)
+
+    ok = True
+    for (ue_id, metric_name), samples in EXPECTED.items():
+        expected_timestamps = [start_ms + idx * GRANUL_PERIOD for idx, _ in samples]
+        expected_values = [value for _, value in samples]
+        for store in stores:
+            timestamps, values = store.get_window('gnb', ue_id, metric_name)
+            if list(timestamps) != expected_timestamps or list(values) != expected_values:
+                print("KpmMeasStore({}) {}/{}: {} {}, expected {} {}".format(store.dtype, ue_id, metric_name, list(timestamps), list(values), expected_timestamps, expected_values))
+                ok = False
+        stats = aggregator.get_ue_stats('gnb', ue_id, metric_name)
+        count = 0 if stats is None else stats['count']
+        if count != len(samples) or (samples and stats['sum'] != sum(expected_values)):
+            print("KpmAggregator {}/{}: {}, expected {} samples".format(ue_id, metric_name, stats, len(samples)))
+            ok = False
+    return ok
+
+
+if __name__ == '__main__':
+    packer = e2sm_kpm_packer()
+    ok = True
+    for fast_decode in [True, False]:
+        if not check(packer, fast_decode):
+            ok = False
+    print("noValue check {}".format("passed" if ok else "FAILED"))
+    sys.exit(0 if ok else 1)
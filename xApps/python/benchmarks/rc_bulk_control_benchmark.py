@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Compares per-UE slice PRB quota control calls with the bulk control API.
+# RMR is not needed, sends are counted by a dummy parent instead. Like rmr_send_msg, which runs in C
+# without the GIL, the dummy send sleeps --send_us per message, so the bulk API can overlap building
+# the next requests with sending.
+
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.e2sm_rc_module import e2sm_rc_module
+
+
+class DummyXapp(object):
+    def __init__(self, send_us):
+        self.sent = 0
+        self.send_s = send_us / 1e6
+        self.control_tracker = None
+
+    def rmr_send(self, e2_node_id, payload, mtype, retries=1):
+        if self.send_s > 0:
+            time.sleep(self.send_s)
+        self.sent += 1
+        return 0
+
+
+def run_per_ue(e2sm_rc, e2_node_id, ue_prb_ratios):
+    start = time.perf_counter()
+    for ue_id, min_prb_ratio, max_prb_ratio, dedicated_prb_ratio in ue_prb_ratios:
+        e2sm_rc.control_slice_level_prb_quota(e2_node_id, ue_id, min_prb_ratio, max_prb_ratio, dedicated_prb_ratio)
+    return time.perf_counter() - start
+
+
+def run_per_ue_uncached(e2sm_rc, e2_node_id, ue_prb_ratios):
+    # every control encoded from scratch, as without the control caches
+    start = time.perf_counter()
+    for ue_id, min_prb_ratio, max_prb_ratio, dedicated_prb_ratio in ue_prb_ratios:
+        e2sm_rc.clear_control_cache()
+        e2sm_rc.control_slice_level_prb_quota(e2_node_id, ue_id, min_prb_ratio, max_prb_ratio, dedicated_prb_ratio)
+    return time.perf_counter() - start
+
+
+def run_bulk(e2sm_rc, e2_node_id, ue_prb_ratios):
+    start = time.perf_counter()
+    e2sm_rc.control_slice_level_prb_quota_bulk(e2_node_id, ue_prb_ratios)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk slice PRB quota control benchmark')
+    parser.add_argument("--ues", type=int, nargs='+', default=[100, 1000], help="Numbers of UEs")
+    parser.add_argument("--ratio_sets", type=int, default=3, help="Number of distinct (min, max) PRB ratio combinations")
+    parser.add_argument("--send_us", type=int, default=20, help="Time of one dummy RMR send in us, 0 for no send time")
+    args = parser.parse_args()
+
+    e2_node_id = 'gnbd_001_001_00019b_0'
+    e2sm_rc = e2sm_rc_module(DummyXapp(args.send_us), control_cache_size=max(args.ues))
+    e2sm_rc.e2sm_rc_compiler # compile the codec before measuring
+
+    for num_ues in args.ues:
+        ue_prb_ratios = [(ue_id, 1 + ue_id % args.ratio_sets, 50, 100) for ue_id in range(num_ues)]
+        results = {}
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for name, run in [('per-UE, no cache', run_per_ue_uncached), ('per-UE', run_per_ue), ('bulk', run_bulk)]:
+                e2sm_rc.clear_control_cache()
+                cold = run(e2sm_rc, e2_node_id, ue_prb_ratios)
+                warm = run(e2sm_rc, e2_node_id, ue_prb_ratios)
+                results[name] = (cold, warm)
+
+        for name, (cold, warm) in results.items():
+            print("{:5d} UEs {:17s} cold cache: {:8.2f} ms, warm cache: {:8.2f} ms".format(num_ues, name, cold * 1000, warm * 1000))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Checks the RIC Control Request builder against the previous list-based implementation
+# and measures time and allocated memory per built request.
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lib.e2sm_rc_module import e2sm_rc_module
+
+
+def legacy_build_ric_control_request(requestor_id, ran_func_id, control_header, control_msg, ack_request):
+    # previous implementation, only valid if all lengths fit into one byte (< 128)
+    requestorID = [0x00, requestor_id]
+    ran_func_id = [0x00, ran_func_id]
+    control_header_len = len(control_header)
+    control_mgs_len = len(control_msg)
+    total_len = 33 + control_header_len + control_mgs_len
+    msg = [0x00, 0x04, 0x00, total_len, 0x00, 0x00, 0x05, 0x00, 0x1d, 0x00, 0x05, 0x00, *requestorID, 0x00, 0x00, 0x00, 0x05,
+           0x00, 0x02, *ran_func_id,
+           0x00, 0x16, 0x00, control_header_len+1, control_header_len, *control_header,
+           0x00, 0x17, 0x00, control_mgs_len+1, control_mgs_len, *control_msg,
+           0x00, 0x15, 0x00, 0x01, ack_request << 6]
+    return bytes(hex_num for hex_num in msg)
+
+
+def verify(e2sm_rc):
+    checked = 0
+    for header_len in range(0, 40, 3):
+        for msg_len in range(0, 128 - 33 - header_len - 2):
+            control_header = bytes(range(header_len))
+            control_msg = bytes(i % 256 for i in range(msg_len))
+            for ack_request in (0, 1):
+                # the previous implementation only supports requestor IDs < 256
+                requestor_id = checked % 255 + 1
+                payload = e2sm_rc._build_ric_control_request(control_header, control_msg, ack_request, requestor_id)
+                expected = legacy_build_ric_control_request(requestor_id, e2sm_rc.ran_func_id, control_header, control_msg, ack_request)
+                if payload != expected:
+                    raise AssertionError("Mismatch for header length {}, message length {}".format(header_len, msg_len))
+                checked += 1
+    print("{} small requests are byte-identical to the previous implementation".format(checked))
+
+    # long message: the previous implementation cannot encode it, check the two-byte length determinants
+    control_msg = bytes(300)
+    payload = e2sm_rc._build_ric_control_request(b'\x01\x02', control_msg, 1)
+    total_len = ((payload[3] & 0x3f) << 8) | payload[4]
+    assert payload[3] & 0x80 and total_len == len(payload) - 5
+    print("300 byte control message encoded, total length {} bytes".format(len(payload)))
+
+
+def measure(name, build, iterations):
+    tracemalloc.start()
+    build()
+    start_peak = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    build()
+    peak = tracemalloc.get_traced_memory()[1] - start_peak
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        build()
+    duration = time.perf_counter() - start
+    print("{:8s} {:6.2f} us per request, peak allocation {:6d} bytes per request".format(name, duration / iterations * 1e6, peak))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RIC Control Request builder benchmark')
+    parser.add_argument("--iterations", type=int, default=100000, help="Number of built requests per measurement")
+    args = parser.parse_args()
+
+    e2sm_rc = e2sm_rc_module(None)
+    verify(e2sm_rc)
+
+    control_header = bytes(8)
+    control_msg = bytes(60)
+    measure("legacy", lambda: legacy_build_ric_control_request(1, 3, control_header, control_msg, 1), args.iterations)
+    measure("current", lambda: e2sm_rc._build_ric_control_request(control_header, control_msg, 1), args.iterations)
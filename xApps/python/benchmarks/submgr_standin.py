@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# Minimal stand-in for the RIC Subscription Manager REST API, for testing subscription handling without a RIC:
+#   POST   /ric/v1/subscriptions                   -> 201 {"SubscriptionId": ..., "SubscriptionInstances": []}
+#   DELETE /ric/v1/subscriptions/<SubscriptionId>  -> 204 (404 for unknown IDs)
+# Every request is answered after --delay_ms, like a SubMgr waiting for the E2 node. If --notify_host is set,
+# the E2EventInstanceId notification is POSTed to the xApp's HTTP server as the real SubMgr does.
+
+import json
+import time
+import argparse
+import threading
+import itertools
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SubMgrStandIn(object):
+    def __init__(self, port=8088, delay_ms=20, notify_host=None):
+        super(SubMgrStandIn, self).__init__()
+        self.delay_ms = delay_ms
+        self.notify_host = notify_host
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+        self.ids = itertools.count(1)
+        self.requests = 0
+        self.max_concurrent = 0
+        self.concurrent = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def uri(self):
+        return "http://127.0.0.1:{}/ric/v1".format(self.server.server_address[1])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="submgr-standin")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _begin_request(self):
+        with self.lock:
+            self.requests += 1
+            self.concurrent += 1
+            self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        time.sleep(self.delay_ms / 1000.0)
+
+    def _end_request(self):
+        with self.lock:
+            self.concurrent -= 1
+
+    def _notify(self, subscription_id, e2_event_instance_id, client_endpoint):
+        url = "http://{}:{}/ric/v1/subscriptions/response".format(self.notify_host, client_endpoint.get('HTTPPort'))
+        body = json.dumps({'SubscriptionId': subscription_id,
+                           'SubscriptionInstances': [{'XappEventInstanceId': 1234, 'E2EventInstanceId': e2_event_instance_id}]})
+        try:
+            urllib.request.urlopen(urllib.request.Request(url, body.encode('utf-8'), {'Content-Type': 'application/json'}), timeout=2)
+        except Exception as e:
+            print("Notification to {} failed: {}".format(url, e))
+
+    def _make_handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, body=b''):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self):
+                # also for DELETE, the REST client sends '{}' and the connection is kept alive
+                return json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+            def do_POST(self):
+                request = self._read_body()
+                standin._begin_request()
+                try:
+                    with standin.lock:
+                        e2_event_instance_id = next(standin.ids)
+                        subscription_id = "standin-{}".format(e2_event_instance_id)
+                        standin.subscriptions[subscription_id] = request.get('Meid', request.get('meid'))
+                    self._reply(201, json.dumps({'SubscriptionId': subscription_id, 'SubscriptionInstances': []}).encode('utf-8'))
+                finally:
+                    standin._end_request()
+                if standin.notify_host is not None:
+                    standin._notify(subscription_id, e2_event_instance_id, request.get('ClientEndpoint', {}))
+
+            def do_DELETE(self):
+                self._read_body()
+                standin._begin_request()
+                try:
+                    subscription_id = self.path.rsplit('/', 1)[-1]
+                    with standin.lock:
+                        found = subscription_id in standin.subscriptions
+                        standin.subscriptions.pop(subscription_id, None)
+                    self._reply(204 if found else 404)
+                finally:
+                    standin._end_request()
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stand-in Subscription Manager')
+    parser.add_argument("--port", type=int, default=8088, help="REST API port")
+    parser.add_argument("--delay_ms", type=int, default=20, help="Delay of every response in ms")
+    parser.add_argument("--notify_host", type=str, default=None, help="Host of the xApp HTTP server for E2EventInstanceId notifications")
+    args = parser.parse_args()
+
+    standin = SubMgrStandIn(args.port, args.delay_ms, args.notify_host)
+    print("Stand-in Subscription Manager listening on {}".format(standin.uri))
+    standin.server.serve_forever()
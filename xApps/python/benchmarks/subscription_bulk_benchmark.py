@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# Subscribes to and unsubscribes from N E2 nodes through a stand-in Subscription Manager,
+# one request after another vs. xAppBase.subscribe_bulk/unsubscribe_all. Requires ricxappframe and RMR.
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ricxappframe.xapp_subscribe as subscribe
+from lib.xAppBase import xAppBase
+from lib.e2sm_kpm_module import e2sm_types
+from submgr_standin import SubMgrStandIn
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Bulk subscription benchmark')
+    parser.add_argument("--e2_nodes", type=int, default=200, help="Number of E2 nodes")
+    parser.add_argument("--delay_ms", type=int, default=20, help="Stand-in Subscription Manager response delay in ms")
+    parser.add_argument("--max_parallel", type=int, default=None, help="Maximum number of parallel REST requests")
+    parser.add_argument("--http_server_port", type=int, default=8092, help="HTTP server port of the xApp")
+    parser.add_argument("--rmr_port", type=int, default=4562, help="RMR port of the xApp")
+    args = parser.parse_args()
+
+    standin = SubMgrStandIn(0, args.delay_ms)
+    standin.start()
+
+    xapp = xAppBase(http_server_port=args.http_server_port, rmr_port=args.rmr_port, rmr_ready_timeout=0.5)
+    xapp.subscriber = subscribe.NewSubscriber(standin.uri)
+    xapp.share_subscriptions = False
+
+    e2_node_ids = ['gnb_{:04d}'.format(i) for i in range(args.e2_nodes)]
+    event_trigger_def = xapp.e2sm_kpm.e2sm_kpm_compiler.pack_event_trigger_def(1000)
+    action_def = xapp.e2sm_kpm.e2sm_kpm_compiler.pack_action_def_format1(['DRB.UEThpDl', 'DRB.UEThpUl'], 1000)
+
+    start = time.perf_counter()
+    subscription_ids = [xapp.subscribe(e2_node_id, 2, event_trigger_def, action_def, None, e2sm_types.E2SM_KPM) for e2_node_id in e2_node_ids]
+    serial_subscribe = time.perf_counter() - start
+    start = time.perf_counter()
+    for subscription_id in subscription_ids:
+        xapp.unsubscribe(subscription_id)
+    serial_unsubscribe = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = xapp.subscribe_bulk(e2_node_ids, 2, event_trigger_def, action_def, None, e2sm_types.E2SM_KPM, max_parallel=args.max_parallel)
+    bulk_subscribe = time.perf_counter() - start
+    failed = [result for result in results if result.error is not None]
+    start = time.perf_counter()
+    xapp.unsubscribe_all(max_parallel=args.max_parallel)
+    bulk_unsubscribe = time.perf_counter() - start
+
+    print("{} E2 nodes, {} ms SubMgr delay, {} failed bulk subscriptions, max. {} concurrent requests".format(
+          args.e2_nodes, args.delay_ms, len(failed), standin.max_concurrent))
+    print("subscribe:   serial {:6.2f} s, bulk {:6.2f} s".format(serial_subscribe, bulk_subscribe))
+    print("unsubscribe: serial {:6.2f} s, bulk {:6.2f} s".format(serial_unsubscribe, bulk_unsubscribe))
+
+    xapp.httpServer.stop()
+    standin.stop()
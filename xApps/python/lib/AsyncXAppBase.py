@@ -0,0 +1,133 @@
+import asyncio
+import functools
+import threading
+
+from ricxappframe.xapp_frame import rmr
+from .xAppBase import xAppBase
+from .e2sm_kpm_module import e2sm_types
+
+
+class AsyncXAppBase(xAppBase):
+    '''
+    asyncio variant of xAppBase.
+
+    The xApp start function is a coroutine running in an event loop. A single background thread runs
+    the RMR receive loop and hands decoded RIC indications over to the event loop, blocking REST and
+    RMR calls are executed in the loop's default executor.
+
+    Example:
+        class MyXapp(AsyncXAppBase):
+            @AsyncXAppBase.start_function
+            async def start(self, e2_node_ids):
+                for e2_node_id in e2_node_ids:
+                    await self.e2sm_kpm.subscribe_report_service_style_1(e2_node_id, 1000, ['DRB.UEThpDl'], 1000, None)
+                async for e2_agent_id, subscription_id, indication_hdr, indication_msg in self.indications():
+                    ...
+    '''
+    def __init__(self, config=None, http_server_port=8090, rmr_port=4560, rmr_flags=0x00, rmr_ready_timeout=None, preload_codecs=False, max_indication_queue=10000):
+        super(AsyncXAppBase, self).__init__(config, http_server_port, rmr_port, rmr_flags, rmr_ready_timeout, preload_codecs)
+        self.loop = None
+        self.main_task = None
+        self.rmr_thread = None
+        self.max_indication_queue = max_indication_queue
+        self.indication_queue = None
+        self.dropped_indications = 0
+
+    @classmethod
+    def start_function(cls, fun):
+        def wrapper(self, *args, **kwargs):
+            self.running = True
+            asyncio.run(self._async_main(fun, *args, **kwargs))
+        return wrapper
+
+    async def _async_main(self, fun, *args, **kwargs):
+        self.loop = asyncio.get_running_loop()
+        self.indication_queue = asyncio.Queue(self.max_indication_queue)
+
+        # RMR has no asyncio support, so its receive loop runs in one thread bridged into the event loop
+        self.rmr_thread = threading.Thread(target=self._run, name="rmr-receive")
+        self.rmr_thread.daemon = True
+        self.rmr_thread.start()
+
+        self.main_task = asyncio.ensure_future(fun(self, *args, **kwargs))
+        try:
+            await self.main_task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.running = False
+            await self.loop.run_in_executor(None, self.unsubscribe_all)
+            self.httpServer.stop()
+            self.rmr_thread.join()
+            if (self.indication_dispatcher is not None):
+                self.indication_dispatcher.stop()
+            if (self.kpm_decode_pool is not None):
+                self.kpm_decode_pool.shutdown(wait=False)
+            self.rmr_send_pool.free_all()
+            rmr.rmr_close(self.rmr_client)
+
+    def _deliver_indication(self, indication_callback, args):
+        # runs in the event loop
+        if indication_callback is None:
+            if self.indication_queue.full():
+                # do not let a slow consumer stall the event loop, drop the oldest indication
+                self.indication_queue.get_nowait()
+                self.dropped_indications += 1
+            self.indication_queue.put_nowait(args)
+        elif asyncio.iscoroutinefunction(indication_callback):
+            self.loop.create_task(indication_callback(*args))
+        else:
+            indication_callback(*args)
+
+    def _wrap_indication_callback(self, indication_callback, batch_indications):
+        # returns a callback that is called from the RMR thread and forwards indications to the event loop
+        def thread_callback(*args):
+            if batch_indications and indication_callback is None:
+                # the indications iterator always yields single indications
+                subscription_id, indications = args
+                for indication in indications:
+                    # (e2_agent_id, indication_hdr, indication_msg) or (e2_agent_id, lazy indication)
+                    self.loop.call_soon_threadsafe(self._deliver_indication, None, (indication[0], subscription_id) + indication[1:])
+            else:
+                self.loop.call_soon_threadsafe(self._deliver_indication, indication_callback, args)
+        # lets unsubscribe find the consumer by the original callback
+        thread_callback.__wrapped__ = indication_callback
+        return thread_callback
+
+    async def subscribe(self, e2_node_id, ran_function_id, event_trigger_def, action_def, indication_callback=None, e2sm_type=e2sm_types.E2SM_UNKNOWN, batch_indications=False, lazy_indications=False):
+        # indication_callback can be a function, a coroutine function or None, in which case
+        # the indications are available through the indications() iterator
+        thread_callback = self._wrap_indication_callback(indication_callback, batch_indications)
+        subscribe = functools.partial(xAppBase.subscribe, self, e2_node_id, ran_function_id, event_trigger_def, action_def,
+                                      thread_callback, e2sm_type, batch_indications, lazy_indications)
+        return await self.loop.run_in_executor(None, subscribe)
+
+    async def subscribe_bulk(self, e2_node_ids, ran_function_id, event_trigger_def, action_def, indication_callback=None, e2sm_type=e2sm_types.E2SM_UNKNOWN,
+                             batch_indications=False, lazy_indications=False, max_parallel=None, timeout=10):
+        # see xAppBase.subscribe_bulk, the indication callback is handled as in subscribe
+        thread_callback = self._wrap_indication_callback(indication_callback, batch_indications)
+        subscribe_bulk = functools.partial(xAppBase.subscribe_bulk, self, e2_node_ids, ran_function_id, event_trigger_def, action_def,
+                                           thread_callback, e2sm_type, batch_indications, lazy_indications, max_parallel, timeout)
+        return await self.loop.run_in_executor(None, subscribe_bulk)
+
+    async def unsubscribe_async(self, subscription_id, indication_callback=None):
+        return await self.loop.run_in_executor(None, self.unsubscribe, subscription_id, indication_callback)
+
+    async def control_slice_level_prb_quota(self, e2_node_id, ue_id, min_prb_ratio, max_prb_ratio, dedicated_prb_ratio, ack_request=1):
+        control = functools.partial(self.e2sm_rc.control_slice_level_prb_quota, e2_node_id, ue_id, min_prb_ratio, max_prb_ratio, dedicated_prb_ratio, ack_request)
+        return await self.loop.run_in_executor(None, control)
+
+    async def indications(self):
+        # async iterator of (e2_agent_id, subscription_id, indication_hdr, indication_msg),
+        # or (e2_agent_id, subscription_id, indication) for subscriptions with lazy_indications=True
+        while self.running:
+            yield await self.indication_queue.get()
+
+    def stop(self):
+        if self.loop is None or self.main_task is None:
+            # not started yet
+            super(AsyncXAppBase, self).stop()
+            return
+        # the main coroutine is cancelled and cleans up in the event loop
+        self.running = False
+        self.loop.call_soon_threadsafe(self.main_task.cancel)
@@ -0,0 +1,71 @@
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+import threading
+import asn1tools
+
+# Compiled ASN.1 specifications shared by all codecs of the process, key -> compiled specification
+_compiled_specs = {}
+_compiled_specs_lock = threading.Lock()
+
+
+def _get_cache_dir():
+    # set XAPP_ASN1_CACHE_DIR to an empty string to disable the on-disk cache
+    return os.environ.get('XAPP_ASN1_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'xapp-asn1'))
+
+
+def _get_cache_key(asn1_files, codec):
+    # the compiled specification depends on the .asn sources, codec, asn1tools version and pickle format
+    key = hashlib.sha256()
+    key.update(asn1tools.__version__.encode('utf-8'))
+    key.update(codec.encode('utf-8'))
+    key.update('{}.{}'.format(sys.version_info[0], sys.version_info[1]).encode('utf-8'))
+    for asn1_file in asn1_files:
+        with open(asn1_file, 'rb') as f:
+            key.update(f.read())
+    return key.hexdigest()
+
+
+def _load_from_disk(cache_file):
+    try:
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        # missing, corrupted or incompatible cache file, compile again
+        return None
+
+
+def _store_to_disk(cache_dir, cache_file, compiled_spec):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # write to a temporary file first, so concurrently starting xApps never read a partial file
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(compiled_spec, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        print("Cannot store compiled ASN.1 specification in {}: {}".format(cache_dir, e))
+
+
+def compile_files(asn1_files, codec='per'):
+    # Same as asn1tools.compile_files, but the result is shared process-wide and cached on disk.
+    key = _get_cache_key(asn1_files, codec)
+    with _compiled_specs_lock:
+        compiled_spec = _compiled_specs.get(key, None)
+        if compiled_spec is not None:
+            return compiled_spec
+
+        cache_dir = _get_cache_dir()
+        cache_file = os.path.join(cache_dir, key + '.pickle') if cache_dir else None
+        if cache_file is not None:
+            compiled_spec = _load_from_disk(cache_file)
+
+        if compiled_spec is None:
+            compiled_spec = asn1tools.compile_files(asn1_files, codec)
+            if cache_file is not None:
+                _store_to_disk(cache_dir, cache_file, compiled_spec)
+
+        _compiled_specs[key] = compiled_spec
+        return compiled_spec
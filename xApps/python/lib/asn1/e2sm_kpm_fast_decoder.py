@@ -0,0 +1,242 @@
+import math
+
+# Hand-written APER decoder for the common E2SM-KPM indications, i.e. Indication Header Format 1 without optional
+# fields and Indication Message Format 1 and 3 with integer/real/noValue measurement records, unlabeled metrics
+# and gNB-DU/gNB-CU-UP UE IDs. Returns the same dicts as asn1tools. Everything else raises UnsupportedEncoding
+# and is decoded with asn1tools instead (see e2sm_kpm_packer.unpack_indication_message).
+
+
+class UnsupportedEncoding(Exception):
+    pass
+
+
+class _AperReader(object):
+    __slots__ = ('data', 'size', 'pos')
+
+    def __init__(self, data):
+        self.data = data
+        self.size = len(data)
+        self.pos = 0  # in bits
+
+    def read_bit(self):
+        pos = self.pos
+        self.pos = pos + 1
+        return (self.data[pos >> 3] >> (7 - (pos & 7))) & 1
+
+    def read_bits(self, num_bits):
+        pos = self.pos
+        start = pos >> 3
+        end_pos = pos + num_bits
+        end = (end_pos + 7) >> 3
+        if end > self.size:
+            raise UnsupportedEncoding("truncated data")
+        self.pos = end_pos
+        return (int.from_bytes(self.data[start:end], 'big') >> ((end << 3) - end_pos)) & ((1 << num_bits) - 1)
+
+    def align(self):
+        self.pos = (self.pos + 7) & ~7
+
+    def read_octets(self, num_octets):
+        # aligned octets
+        start = (self.pos + 7) >> 3
+        end = start + num_octets
+        if end > self.size:
+            raise UnsupportedEncoding("truncated data")
+        self.pos = end << 3
+        return self.data[start:end]
+
+    def read_uint16(self):
+        # aligned two-octet constrained whole number (range 257..64K)
+        start = (self.pos + 7) >> 3
+        self.pos = (start + 2) << 3
+        return (self.data[start] << 8) | self.data[start + 1]
+
+    def read_length(self):
+        # aligned length determinant, fragmented lengths (>= 16K) are not supported
+        start = (self.pos + 7) >> 3
+        first = self.data[start]
+        if first < 0x80:
+            self.pos = (start + 1) << 3
+            return first
+        if first < 0xC0:
+            self.pos = (start + 2) << 3
+            return ((first & 0x3F) << 8) | self.data[start + 1]
+        raise UnsupportedEncoding("fragmented length")
+
+    def read_uint32(self, lower_bound):
+        # constrained whole number with range > 64K and up to 4 octets: 2 bits octet count, aligned octets
+        num_octets = self.read_bits(2) + 1
+        return int.from_bytes(self.read_octets(num_octets), 'big') + lower_bound
+
+
+def _decode_real(octets):
+    # X.690 REAL contents as used by PER
+    if not octets:
+        return 0.0
+    first = octets[0]
+    if first & 0x80:
+        # binary encoding
+        exponent_length = (first & 0x03) + 1
+        offset = 1
+        if exponent_length == 4:
+            exponent_length = octets[1]
+            offset = 2
+        exponent = int.from_bytes(octets[offset:offset + exponent_length], 'big', signed=True)
+        mantissa = int.from_bytes(octets[offset + exponent_length:], 'big') << ((first >> 2) & 0x03)
+        base = (first >> 4) & 0x03
+        if base == 3:
+            raise UnsupportedEncoding("reserved REAL base")
+        # base 2, 8 or 16
+        value = math.ldexp(mantissa, exponent * (1, 3, 4)[base])
+        return -value if first & 0x40 else value
+    if first == 0x40:
+        return float('inf')
+    if first == 0x41:
+        return float('-inf')
+    if first == 0x42:
+        return float('nan')
+    if first == 0x43:
+        return -0.0
+    if first & 0xC0 == 0:
+        # decimal encoding (ISO 6093 NR1/NR2/NR3)
+        return float(octets[1:].decode('ascii').replace(',', '.'))
+    raise UnsupportedEncoding("unsupported REAL encoding")
+
+
+def _decode_meas_record(reader):
+    num_items = reader.read_length()
+    meas_record = []
+    append = meas_record.append
+    for _ in range(num_items):
+        # extension bit + 2 bits root alternative index
+        choice = reader.read_bits(3)
+        if choice == 0:
+            append(('integer', reader.read_uint32(0)))
+        elif choice == 1:
+            append(('real', _decode_real(reader.read_octets(reader.read_length()))))
+        elif choice == 2:
+            append(('noValue', None))
+        else:
+            raise UnsupportedEncoding("measurement record extension")
+    return meas_record
+
+
+def _decode_meas_data(reader):
+    num_items = reader.read_uint16() + 1
+    meas_data = []
+    for _ in range(num_items):
+        # extension bit + incompleteFlag presence bit
+        preamble = reader.read_bits(2)
+        if preamble & 0x02:
+            raise UnsupportedEncoding("MeasurementDataItem extension")
+        meas_data_item = {'measRecord': _decode_meas_record(reader)}
+        if preamble & 0x01:
+            # ENUMERATED {true, ...}, only the extension bit
+            if reader.read_bit():
+                raise UnsupportedEncoding("incompleteFlag extension")
+            meas_data_item['incompleteFlag'] = 'true'
+        meas_data.append(meas_data_item)
+    return meas_data
+
+
+def _decode_meas_info_list(reader):
+    num_items = reader.read_uint16() + 1
+    meas_info_list = []
+    for _ in range(num_items):
+        # MeasurementInfoItem extension bit, MeasurementType extension bit and alternative index
+        preamble = reader.read_bits(3)
+        if preamble & 0x06:
+            raise UnsupportedEncoding("MeasurementInfoItem/MeasurementType extension")
+        if preamble & 0x01:
+            # measID INTEGER (1..65536, ...)
+            if reader.read_bit():
+                raise UnsupportedEncoding("measID extension")
+            meas_type = ('measID', reader.read_uint16() + 1)
+        else:
+            # measName PrintableString (SIZE(1..150, ...)), 8 bits per character in APER
+            if reader.read_bit():
+                raise UnsupportedEncoding("measName extension")
+            name_length = reader.read_bits(8) + 1
+            meas_type = ('measName', reader.read_octets(name_length).decode('ascii'))
+
+        num_labels = reader.read_length()
+        label_info_list = []
+        for _ in range(num_labels):
+            # LabelInfoItem extension bit, MeasurementLabel extension bit, 21 presence bits and
+            # the extension bit of noLabel: only labels with noLabel and nothing else are supported
+            if reader.read_bits(24) != 0x200000:
+                raise UnsupportedEncoding("measurement label")
+            label_info_list.append({'measLabel': {'noLabel': 'true'}})
+        meas_info_list.append({'measType': meas_type, 'labelInfoList': label_info_list})
+    return meas_info_list
+
+
+def _decode_format1(reader):
+    # extension bit + measInfoList and granulPeriod presence bits
+    preamble = reader.read_bits(3)
+    if preamble & 0x04:
+        raise UnsupportedEncoding("Format1 extension")
+    content = {'measData': _decode_meas_data(reader)}
+    if preamble & 0x02:
+        content['measInfoList'] = _decode_meas_info_list(reader)
+    if preamble & 0x01:
+        content['granulPeriod'] = reader.read_uint32(1)
+    return content
+
+
+def _decode_ue_id(reader):
+    # UEID extension bit + 3 bits root alternative index, UEID-GNB-DU/UEID-GNB-CU-UP extension bit + ran-UEID presence bit
+    preamble = reader.read_bits(6)
+    alternative = preamble >> 2
+    if alternative == 1:
+        name, id_name = 'gNB-DU-UEID', 'gNB-CU-UE-F1AP-ID'
+    elif alternative == 2:
+        name, id_name = 'gNB-CU-UP-UEID', 'gNB-CU-CP-UE-E1AP-ID'
+    else:
+        raise UnsupportedEncoding("UE ID type")
+    if preamble & 0x02:
+        raise UnsupportedEncoding("UE ID extension")
+    ue_id = {id_name: reader.read_uint32(0)}
+    if preamble & 0x01:
+        ue_id['ran-UEID'] = reader.read_octets(8)
+    return (name, ue_id)
+
+
+def _decode_format3(reader):
+    if reader.read_bit():
+        raise UnsupportedEncoding("Format3 extension")
+    num_reports = reader.read_uint16() + 1
+    ue_meas_report_list = []
+    for _ in range(num_reports):
+        if reader.read_bit():
+            raise UnsupportedEncoding("UEMeasurementReportItem extension")
+        ue_id = _decode_ue_id(reader)
+        ue_meas_report_list.append({'ueID': ue_id, 'measReport': _decode_format1(reader)})
+    return {'ueMeasReportList': ue_meas_report_list}
+
+
+def decode_indication_message(data):
+    # E2SM-KPM-IndicationMessage with Format 1 or Format 3 content
+    reader = _AperReader(bytes(data))
+    # extension bits of the SEQUENCE and the formats CHOICE, then the root alternative index
+    preamble = reader.read_bits(3)
+    if preamble == 0:
+        return {'indicationMessage-formats': ('indicationMessage-Format1', _decode_format1(reader))}
+    if preamble == 0x02:
+        # Format3 is the first extension alternative: 6 bit index and an open type
+        if reader.read_bits(6) != 0:
+            raise UnsupportedEncoding("indication message format")
+        open_type_length = reader.read_length()
+        open_type_end = reader.pos + (open_type_length << 3)
+        content = _decode_format3(reader)
+        if reader.pos > open_type_end:
+            raise UnsupportedEncoding("open type length mismatch")
+        return {'indicationMessage-formats': ('indicationMessage-Format3', content)}
+    raise UnsupportedEncoding("indication message format")
+
+
+def decode_indication_header_format1(data):
+    # E2SM-KPM-IndicationHeader-Format1 with colletStartTime only
+    if len(data) < 9 or data[0] & 0xF8:
+        raise UnsupportedEncoding("optional indication header fields")
+    return {'colletStartTime': bytes(data[1:9])}
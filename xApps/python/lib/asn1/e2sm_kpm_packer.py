@@ -1,17 +1,67 @@
 import os
-import asn1tools
+import threading
+from collections import OrderedDict
+from .asn1_cache import compile_files
+from . import e2sm_kpm_fast_decoder
+
+def _normalize(value):
+    # hashable form of (nested) encoder inputs, used as cache key
+    if isinstance(value, dict):
+        return tuple(sorted((key, _normalize(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize(item) for item in value)
+    return value
 
 class e2sm_kpm_packer(object):
-    def __init__(self):
+    def __init__(self, encode_cache_size=4096, fast_decode=True):
         super(e2sm_kpm_packer, self).__init__()
         self.my_dir = os.path.dirname(os.path.abspath(__file__))
         asn1_files = [self.my_dir+'/e2sm-v5.00.asn', self.my_dir+'/e2sm-kpm-v4.00.asn']
-        self.asn1_compiler = asn1tools.compile_files(asn1_files,'per')
+        self.asn1_compiler = compile_files(asn1_files, 'per')  # compiled once and cached on disk
+
+        # LRU cache of encoded event trigger and action definitions, keyed by the normalized inputs
+        self.encode_cache = OrderedDict()
+        self.encode_cache_size = encode_cache_size
+        self.encode_cache_lock = threading.Lock()
+        self.encode_cache_hits = 0
+        self.encode_cache_misses = 0
+
+        # decode common indications with the hand-written decoder, falling back to asn1tools for everything else
+        self.fast_decode = fast_decode
+        self.decode_stats_lock = threading.Lock()  # the decode pool's workers decode concurrently
+        self.fast_decoded = 0
+        self.fallback_decoded = 0
+
+    def _get_cached(self, key):
+        with self.encode_cache_lock:
+            encoded = self.encode_cache.get(key, None)
+            if encoded is None:
+                self.encode_cache_misses += 1
+                return None
+            self.encode_cache.move_to_end(key)
+            self.encode_cache_hits += 1
+            return encoded
+
+    def _put_cached(self, key, encoded):
+        with self.encode_cache_lock:
+            self.encode_cache[key] = encoded
+            if len(self.encode_cache) > self.encode_cache_size:
+                self.encode_cache.popitem(last=False)
+        return encoded
+
+    def get_encode_cache_stats(self):
+        with self.encode_cache_lock:
+            return {'hits': self.encode_cache_hits, 'misses': self.encode_cache_misses, 'size': len(self.encode_cache)}
 
     def pack_event_trigger_def(self, reportingPeriod):
+        key = ('eventTrigger-format1', reportingPeriod)
+        e2sm_kpm_trigger_def = self._get_cached(key)
+        if e2sm_kpm_trigger_def is not None:
+            return e2sm_kpm_trigger_def
+
         e2sm_kpm_trigger_def = {'eventDefinition-formats': ('eventDefinition-Format1', {'reportingPeriod': reportingPeriod})}
         e2sm_kpm_trigger_def = self.asn1_compiler.encode('E2SM-KPM-EventTriggerDefinition', e2sm_kpm_trigger_def)
-        return e2sm_kpm_trigger_def
+        return self._put_cached(key, e2sm_kpm_trigger_def)
 
     def _pack_meas_info_list(self, metric_names):
         measInfoList = []
@@ -39,6 +89,11 @@ class e2sm_kpm_packer(object):
         if not isinstance(metric_names, list):
             metric_names = [metric_names]
 
+        key = ('actionDefinition-format1', _normalize(metric_names), granulPeriod)
+        action_def = self._get_cached(key)
+        if action_def is not None:
+            return action_def
+
         measInfoList = self._pack_meas_info_list(metric_names)
 
         action_def = {'ric-Style-Type': 1,
@@ -48,12 +103,17 @@ class e2sm_kpm_packer(object):
                           })
                      }
         action_def = self.asn1_compiler.encode('E2SM-KPM-ActionDefinition', action_def)
-        return action_def
+        return self._put_cached(key, action_def)
 
     def pack_action_def_format2(self, ue_id, metric_names, granulPeriod=100):
         if not isinstance(metric_names, list):
             metric_names = [metric_names]
 
+        key = ('actionDefinition-format2', ue_id, _normalize(metric_names), granulPeriod)
+        action_def = self._get_cached(key)
+        if action_def is not None:
+            return action_def
+
         ue_id = self._pack_ue_id_list([ue_id])
         ue_id = tuple(ue_id[0]['ueID']) # extract as there is only 1 UE
 
@@ -67,7 +127,7 @@ class e2sm_kpm_packer(object):
                        })
                      }
         action_def = self.asn1_compiler.encode('E2SM-KPM-ActionDefinition', action_def)
-        return action_def
+        return self._put_cached(key, action_def)
 
     def pack_action_def_format3(self, matchingConds, metric_names, granulPeriod=100):
         if not isinstance(metric_names, list):
@@ -77,6 +137,11 @@ class e2sm_kpm_packer(object):
             print("Currently only 1 metric can be requested in E2SM-KPM Report Style 3")
             exit(1)
 
+        key = ('actionDefinition-format3', _normalize(matchingConds), _normalize(metric_names), granulPeriod)
+        action_def = self._get_cached(key)
+        if action_def is not None:
+            return action_def
+
         matchingCondList = self._pack_matching_conds_list(matchingConds)
 
         action_def = {'ric-Style-Type': 3, 
@@ -87,12 +152,17 @@ class e2sm_kpm_packer(object):
                       'granulPeriod': granulPeriod})
                      }
         action_def = self.asn1_compiler.encode('E2SM-KPM-ActionDefinition', action_def)
-        return action_def
+        return self._put_cached(key, action_def)
 
     def pack_action_def_format4(self, matchingUeConds, metric_names, granulPeriod=100):
         if not isinstance(metric_names, list):
             metric_names = [metric_names]
 
+        key = ('actionDefinition-format4', _normalize(matchingUeConds), _normalize(metric_names), granulPeriod)
+        action_def = self._get_cached(key)
+        if action_def is not None:
+            return action_def
+
         measInfoList = self._pack_meas_info_list(metric_names)
         matchingUeCondList = self._pack_matching_ue_conds_list(matchingUeConds)
 
@@ -105,12 +175,17 @@ class e2sm_kpm_packer(object):
                         }}
                      )}
         action_def = self.asn1_compiler.encode('E2SM-KPM-ActionDefinition', action_def)
-        return action_def
+        return self._put_cached(key, action_def)
 
     def pack_action_def_format5(self, ue_ids, metric_names, granulPeriod=100):
         if not isinstance(metric_names, list):
             metric_names = [metric_names]
 
+        key = ('actionDefinition-format5', _normalize(ue_ids), _normalize(metric_names), granulPeriod)
+        action_def = self._get_cached(key)
+        if action_def is not None:
+            return action_def
+
         matchingUEidList = self._pack_ue_id_list(ue_ids)
         measInfoList = self._pack_meas_info_list(metric_names)
 
@@ -123,9 +198,14 @@ class e2sm_kpm_packer(object):
                         })
                      }
         action_def = self.asn1_compiler.encode('E2SM-KPM-ActionDefinition', action_def)
-        return action_def
+        return self._put_cached(key, action_def)
 
     def unpack_indication_header_format1(self, msg_bytes):
+        if self.fast_decode:
+            try:
+                return e2sm_kpm_fast_decoder.decode_indication_header_format1(msg_bytes)
+            except Exception:
+                pass
         indication_hdr = self.asn1_compiler.decode('E2SM-KPM-IndicationHeader-Format1', msg_bytes)
         return indication_hdr
 
@@ -133,5 +213,20 @@ class e2sm_kpm_packer(object):
         return self.unpack_indication_header_format1(msg_bytes)
 
     def unpack_indication_message(self, msg_bytes):
+        if self.fast_decode:
+            try:
+                indication_msg = e2sm_kpm_fast_decoder.decode_indication_message(msg_bytes)
+                with self.decode_stats_lock:
+                    self.fast_decoded += 1
+                return indication_msg
+            except Exception:
+                # not supported by the fast decoder (or malformed), asn1tools decodes it or raises the proper error
+                pass
+        with self.decode_stats_lock:
+            self.fallback_decoded += 1
         indication_msg = self.asn1_compiler.decode('E2SM-KPM-IndicationMessage', msg_bytes)
         return indication_msg
+
+    def get_decode_stats(self):
+        with self.decode_stats_lock:
+            return {'fast_decoded': self.fast_decoded, 'fallback_decoded': self.fallback_decoded}
@@ -0,0 +1,142 @@
+import time
+import heapq
+import bisect
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+
+# result of a RIC control request, latency in seconds from the (last) send until the ACK/FAILURE
+ControlOutcome = namedtuple('ControlOutcome', ['e2_node_id', 'requestor_id', 'success', 'latency'])
+
+
+class _PendingControl(object):
+    def __init__(self, request_id, e2_node_id, payload, timeout, retries):
+        super(_PendingControl, self).__init__()
+        self.request_id = request_id
+        self.e2_node_id = e2_node_id
+        self.payload = payload
+        self.timeout = timeout
+        self.retries = retries
+        self.sent_time = time.monotonic()
+        self.deadline = self.sent_time + timeout
+        self.future = Future()
+
+
+class ControlRequestTracker(object):
+    '''
+    Table of outstanding RIC control requests keyed by (ricRequestorID, ricInstanceID).
+    RIC_CONTROL_ACK/FAILURE messages resolve the request's Future, requests without answer expire after
+    their timeout (optionally after re-sending them) and round-trip latencies are collected in a histogram.
+    '''
+    def __init__(self, resend_func=None, default_timeout=1.0, latency_buckets_ms=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)):
+        super(ControlRequestTracker, self).__init__()
+        # resend_func(e2_node_id, payload) returns the RMR state of the send
+        self.resend_func = resend_func
+        self.default_timeout = default_timeout
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.deadlines = [] # heap of (deadline, request_id), entries of resolved requests are skipped on expiry
+
+        # latency histogram, the last bucket counts latencies above the last bound
+        self.latency_buckets_ms = list(latency_buckets_ms)
+        self.latency_histogram = [0] * (len(self.latency_buckets_ms) + 1)
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+        # counters
+        self.acked = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.resent = 0
+        self.unknown = 0
+
+    def register(self, requestor_id, e2_node_id, payload, timeout=None, retries=0, callback=None, instance_id=0):
+        # Has to be called before sending the request. Returns a Future resolved with a ControlOutcome,
+        # or failing with TimeoutError (no answer) or RuntimeError. callback(future) is called once the Future is done.
+        request_id = (requestor_id, instance_id)
+        pending_control = _PendingControl(request_id, e2_node_id, payload, self.default_timeout if timeout is None else timeout, retries)
+        if callback is not None:
+            pending_control.future.add_done_callback(callback)
+
+        with self.lock:
+            replaced = self.pending.pop(request_id, None)
+            self.pending[request_id] = pending_control
+            heapq.heappush(self.deadlines, (pending_control.deadline, request_id))
+
+        if replaced is not None:
+            # requestor ID wrapped around while the old request was still outstanding
+            replaced.future.set_exception(RuntimeError("RIC control request {} replaced by a new request".format(request_id)))
+        return pending_control.future
+
+    def cancel(self, requestor_id, reason, instance_id=0):
+        # e.g. if the request could not be sent
+        with self.lock:
+            pending_control = self.pending.pop((requestor_id, instance_id), None)
+        if pending_control is not None:
+            pending_control.future.set_exception(RuntimeError(reason))
+
+    def resolve(self, requestor_id, success, instance_id=0):
+        # Called on RIC_CONTROL_ACK (success) or RIC_CONTROL_FAILURE. Returns False for unknown requests.
+        now = time.monotonic()
+        with self.lock:
+            pending_control = self.pending.pop((requestor_id, instance_id), None)
+            if pending_control is None:
+                self.unknown += 1
+                return False
+
+            latency = now - pending_control.sent_time
+            self.latency_histogram[bisect.bisect_left(self.latency_buckets_ms, latency * 1000)] += 1
+            self.latency_sum += latency
+            self.latency_max = max(self.latency_max, latency)
+            if success:
+                self.acked += 1
+            else:
+                self.failed += 1
+
+        pending_control.future.set_result(ControlOutcome(pending_control.e2_node_id, requestor_id, success, latency))
+        return True
+
+    def expire(self):
+        # Re-sends or expires requests past their deadline, cheap if nothing expired.
+        now = time.monotonic()
+        expired = []
+        resend = []
+        with self.lock:
+            while self.deadlines and self.deadlines[0][0] <= now:
+                deadline, request_id = heapq.heappop(self.deadlines)
+                pending_control = self.pending.get(request_id, None)
+                if pending_control is None or pending_control.deadline != deadline:
+                    continue # already resolved or re-sent
+
+                if pending_control.retries > 0 and self.resend_func is not None:
+                    pending_control.retries -= 1
+                    pending_control.sent_time = now
+                    pending_control.deadline = now + pending_control.timeout
+                    heapq.heappush(self.deadlines, (pending_control.deadline, request_id))
+                    self.resent += 1
+                    resend.append(pending_control)
+                else:
+                    del self.pending[request_id]
+                    self.timed_out += 1
+                    expired.append(pending_control)
+
+        for pending_control in resend:
+            self.resend_func(pending_control.e2_node_id, pending_control.payload)
+        for pending_control in expired:
+            pending_control.future.set_exception(TimeoutError("No answer to RIC control request {} within {} s".format(pending_control.request_id, pending_control.timeout)))
+
+    def get_stats(self):
+        with self.lock:
+            answered = self.acked + self.failed
+            return {
+                'pending': len(self.pending),
+                'acked': self.acked,
+                'failed': self.failed,
+                'timed_out': self.timed_out,
+                'resent': self.resent,
+                'unknown': self.unknown,
+                'latency_mean': self.latency_sum / answered if answered else None,
+                'latency_max': self.latency_max if answered else None,
+                # (upper bound in ms or None for the overflow bucket, count)
+                'latency_histogram_ms': list(zip(self.latency_buckets_ms + [None], self.latency_histogram)),
+            }
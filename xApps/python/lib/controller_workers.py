@@ -0,0 +1,186 @@
+import heapq
+import threading
+import time
+from collections import deque
+
+import requests
+
+from .indication_dispatcher import overflow_policy
+
+
+class DashboardPublisher(object):
+    '''
+    Posts dashboard notifications from a background thread, so that a slow or missing dashboard never blocks
+    the central controller. The connection is kept alive in a requests.Session and the queue is bounded,
+    when it is full the oldest or the newest message is dropped (overflow_policy.DROP_OLDEST/DROP_NEWEST).
+
+    Every message is posted as {'message': ...}, the format of the dashboard's /update endpoint. With
+    max_batch_size > 1, bursts are coalesced into {'messages': [...]} posts, which the endpoint has to accept.
+    '''
+    def __init__(self, url='http://localhost:5000/update', max_queue_size=1000, max_batch_size=1, batch_interval=0.05, timeout=2,
+                 policy=overflow_policy.DROP_OLDEST):
+        super(DashboardPublisher, self).__init__()
+        if policy == overflow_policy.BLOCK:
+            raise ValueError("DashboardPublisher never blocks, use DROP_OLDEST or DROP_NEWEST")
+        self.url = url
+        self.max_queue_size = max_queue_size
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_interval = batch_interval  # time to wait for more messages of a burst before posting a batch
+        self.timeout = timeout
+        self.policy = policy
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.session = requests.Session()
+        self.stats = {'queued': 0, 'delivered': 0, 'posts': 0, 'failed': 0, 'dropped': 0}
+        self.dashboard_ok = True
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="dashboard-publisher")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def publish(self, message):
+        # queues a message without blocking, returns False if it was dropped
+        with self.condition:
+            if len(self.queue) >= self.max_queue_size:
+                self.stats['dropped'] += 1
+                if self.policy == overflow_policy.DROP_NEWEST:
+                    return False
+                self.queue.popleft()
+            self.queue.append(message)
+            self.stats['queued'] += 1
+            self.condition.notify()
+        return True
+
+    def _run(self):
+        # posts the queued messages until stopped, then flushes the queue
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                burst = self.running and len(self.queue) < self.max_batch_size
+            if burst:
+                time.sleep(self.batch_interval)
+            with self.condition:
+                batch = [self.queue.popleft() for _ in range(min(self.max_batch_size, len(self.queue)))]
+            self._post(batch)
+
+    def _post(self, batch):
+        payload = {'message': batch[0]} if len(batch) == 1 else {'messages': batch}
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            delivered = response.ok
+            error = "HTTP {}".format(response.status_code)
+        except Exception as e:
+            delivered = False
+            error = e
+        with self.condition:
+            self.stats['posts'] += 1
+            self.stats['delivered' if delivered else 'failed'] += len(batch)
+        # reported once until the dashboard is reachable again
+        if not delivered and self.dashboard_ok:
+            print("Failed to send update to dashboard: {}".format(error))
+        self.dashboard_ok = delivered
+
+    def get_stats(self):
+        with self.condition:
+            return dict(self.stats, queue_size=len(self.queue))
+
+    def stop(self, timeout=None):
+        # sends the queued messages, waiting at most timeout seconds
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout)
+
+
+class DeferredScheduler(object):
+    '''
+    Runs deferred calls from a single thread, ordered by due time in a heap, instead of one threading.Timer
+    thread per call. A call scheduled with the key of a pending call supersedes it, pending calls can be
+    cancelled by key. Cancelled entries stay in the heap until they are popped or most of the heap is cancelled.
+    '''
+    def __init__(self):
+        super(DeferredScheduler, self).__init__()
+        self.heap = []     # [due_time, seq, key, func, args], cancelled entries have func set to None
+        self.pending = {}  # key -> heap entry
+        self.seq = 0
+        self.condition = threading.Condition()
+        self.stats = {'scheduled': 0, 'executed': 0, 'cancelled': 0, 'superseded': 0, 'failed': 0, 'max_lateness': 0.0, 'total_lateness': 0.0}
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="deferred-scheduler")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def schedule(self, delay, func, args=(), key=None):
+        # calls func(*args) after delay seconds, returns the key
+        with self.condition:
+            self.seq += 1
+            if key is None:
+                key = ('seq', self.seq)
+            elif key in self.pending:
+                self.pending.pop(key)[3] = None
+                self.stats['superseded'] += 1
+            entry = [time.monotonic() + delay, self.seq, key, func, args]
+            heapq.heappush(self.heap, entry)
+            self.pending[key] = entry
+            self.stats['scheduled'] += 1
+            if self.heap[0] is entry:
+                self.condition.notify()
+            self._compact()
+        return key
+
+    def cancel(self, key):
+        # returns False if the call is not pending anymore
+        with self.condition:
+            entry = self.pending.pop(key, None)
+            if entry is None:
+                return False
+            entry[3] = None
+            self.stats['cancelled'] += 1
+            self._compact()
+        return True
+
+    def _compact(self):
+        if len(self.heap) > 64 and len(self.heap) > 2 * len(self.pending):
+            self.heap = [entry for entry in self.heap if entry[3] is not None]
+            heapq.heapify(self.heap)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running:
+                    while self.heap and self.heap[0][3] is None:
+                        heapq.heappop(self.heap)
+                    if self.heap and self.heap[0][0] <= time.monotonic():
+                        break
+                    self.condition.wait(self.heap[0][0] - time.monotonic() if self.heap else None)
+                if not self.running:
+                    return
+                due_time, _, key, func, args = heapq.heappop(self.heap)
+                del self.pending[key]
+                lateness = time.monotonic() - due_time
+                self.stats['executed'] += 1
+                self.stats['total_lateness'] += lateness
+                self.stats['max_lateness'] = max(self.stats['max_lateness'], lateness)
+            try:
+                func(*args)
+            except Exception as e:
+                print("Deferred call failed: {}".format(e))
+                with self.condition:
+                    self.stats['failed'] += 1
+
+    def get_stats(self):
+        # queue depth, counters and lateness of the executed calls in seconds
+        with self.condition:
+            stats = dict(self.stats, queue_depth=len(self.pending))
+        stats['mean_lateness'] = stats['total_lateness'] / stats['executed'] if stats['executed'] else 0.0
+        return stats
+
+    def stop(self):
+        # pending calls are not executed
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join()
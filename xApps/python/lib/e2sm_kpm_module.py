@@ -1,5 +1,12 @@
 import datetime
+import threading
 from enum import Enum
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from .asn1.e2sm_kpm_packer import e2sm_kpm_packer
 
 class e2sm_types(Enum):
@@ -17,40 +24,190 @@ def ntp_ts_to_datetime(ntp_timestamp):
     # Convert Unix timestamp to datetime
     return datetime.datetime.utcfromtimestamp(unix_timestamp)
 
+def ntp_ts_to_unix_ms(ntp_timestamp):
+    # 64-bit NTP timestamp (32-bit seconds, 32-bit fraction) to milliseconds since the Unix epoch
+    ntp_epoch_offset = 2208988800
+    return ((ntp_timestamp >> 32) - ntp_epoch_offset) * 1000 + (((ntp_timestamp & 0xFFFFFFFF) * 1000) >> 32)
+
+def collet_start_time_ms(indication_hdr):
+    # colletStartTime of a decoded indication header in ms since the Unix epoch
+    collet_start_time = indication_hdr['colletStartTime']
+    if isinstance(collet_start_time, datetime.datetime):
+        # already converted by e2sm_kpm_module.extract_hdr_info
+        return int(collet_start_time.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+    return ntp_ts_to_unix_ms(int.from_bytes(collet_start_time, "big"))
+
+def _ue_id_value(ue_id):
+    # e.g. ('gNB-DU-UEID', {'gNB-CU-UE-F1AP-ID': 0}) -> 0
+    return list(ue_id[1].values())[0]
+
+def _iter_meas_report(ue_id, meas_report):
+    # measReport with measInfoList (Format 1 content), one measRecord item per metric in every measData item
+    metric_names = [measInfoItem["measType"][1] for measInfoItem in meas_report["measInfoList"]]
+    granulPeriod = meas_report.get("granulPeriod", None)
+    values = [[] for _ in metric_names]
+    for measDataItem in meas_report["measData"]:
+        for idx, measRecordItem in enumerate(measDataItem['measRecord']):
+            values[idx].append(measRecordItem[1])
+    for metric_name, metric_values in zip(metric_names, values):
+        yield ue_id, metric_name, granulPeriod, metric_values
+
+def iter_meas_samples(indication_msg):
+    '''
+    Iterates over the measurements of a decoded E2SM-KPM indication message (Format 1, 2 or 3) without building
+    the nested dicts of extract_meas_data. Yields (ue_id, metric_name, granulPeriod, values) tuples, values holds
+    one value per granularity period. ue_id is None for node-level measurements (Format 1).
+    '''
+    indication_msg_format, indication_msg_content = indication_msg["indicationMessage-formats"]
+    if indication_msg_format == "indicationMessage-Format1":
+        for sample in _iter_meas_report(None, indication_msg_content):
+            yield sample
+    elif indication_msg_format == "indicationMessage-Format2":
+        # measRecord items are ordered by measCondUEidList item and then by the UEs matching its condition
+        granulPeriod = indication_msg_content.get("granulPeriod", None)
+        columns = []
+        for measCondUEidItem in indication_msg_content["measCondUEidList"]:
+            metric_name = measCondUEidItem["measType"][1]
+            for matchingUE in measCondUEidItem.get("matchingUEidList", None) or []:
+                columns.append((_ue_id_value(matchingUE["ueID"]), metric_name))
+        values = [[] for _ in columns]
+        for measDataItem in indication_msg_content["measData"]:
+            for idx, measRecordItem in enumerate(measDataItem['measRecord'][:len(columns)]):
+                values[idx].append(measRecordItem[1])
+        for (ue_id, metric_name), metric_values in zip(columns, values):
+            yield ue_id, metric_name, granulPeriod, metric_values
+    elif indication_msg_format == "indicationMessage-Format3":
+        for ueMeasReport in indication_msg_content["ueMeasReportList"]:
+            for sample in _iter_meas_report(_ue_id_value(ueMeasReport["ueID"]), ueMeasReport['measReport']):
+                yield sample
+
+def _dense_meas_data(ue_ids, metric_names, num_granul_periods):
+    if np is None:
+        raise ImportError("Dense E2SM-KPM measurement data requires numpy, install it with: pip install numpy")
+    return {'ueIds': ue_ids, 'metrics': metric_names,
+            'values': np.full((num_granul_periods, len(ue_ids), len(metric_names)), np.nan)}
+
+def _fill_dense_values(values, measData, ue_idx, metric_idx):
+    # measRecord item i of every measData item goes to values[granularity period, ue_idx[i], metric_idx[i]]
+    num_columns = len(ue_idx)
+    if num_columns == 0 or len(measData) == 0:
+        return
+    nan = float('nan')
+    rows = []
+    for measDataItem in measData:
+        row = [nan if measRecordItem[1] is None else measRecordItem[1] for measRecordItem in measDataItem['measRecord'][:num_columns]]
+        row.extend([nan] * (num_columns - len(row)))
+        rows.append(row)
+    values[:len(rows), ue_idx, metric_idx] = np.array(rows, dtype=values.dtype)
+
+class LazyKpmIndication(object):
+    '''
+    E2SM-KPM RIC indication passed to callbacks of subscriptions with lazy_indications=True.
+    The E2AP RIC indication, the E2SM-KPM header and message and the extracted measurement data are
+    decoded on first access and memoized, so callbacks only pay for the fields they actually read.
+    Decoding errors are raised on access.
+    '''
+    def __init__(self, e2sm_kpm, payload, split_ric_indication):
+        super(LazyKpmIndication, self).__init__()
+        self.e2sm_kpm = e2sm_kpm
+        self.payload = payload
+        # split_ric_indication(payload) returns the (indication_header, indication_message) byte strings
+        self._split_ric_indication = split_ric_indication
+        self._raw = None
+        self._indication_hdr = None
+        self._indication_msg = None
+        self._meas_data = None
+        self._dense_meas_data = None
+
+    def _get_raw(self):
+        if self._raw is None:
+            self._raw = self._split_ric_indication(self.payload)
+        return self._raw
+
+    @property
+    def indication_header(self):
+        # undecoded E2SM-KPM indication header
+        return self._get_raw()[0]
+
+    @property
+    def indication_message(self):
+        # undecoded E2SM-KPM indication message
+        return self._get_raw()[1]
+
+    @property
+    def indication_hdr(self):
+        if self._indication_hdr is None:
+            self._indication_hdr = self.e2sm_kpm.e2sm_kpm_compiler.unpack_indication_header(self.indication_header)
+        return self._indication_hdr
+
+    @property
+    def indication_msg(self):
+        if self._indication_msg is None:
+            self._indication_msg = self.e2sm_kpm.e2sm_kpm_compiler.unpack_indication_message(self.indication_message)
+        return self._indication_msg
+
+    @property
+    def collet_start_time_ms(self):
+        return collet_start_time_ms(self.indication_hdr)
+
+    @property
+    def meas_data(self):
+        # same as e2sm_kpm_module.extract_meas_data(indication_msg)
+        if self._meas_data is None:
+            self._meas_data = self.e2sm_kpm.extract_meas_data(self.indication_msg)
+        return self._meas_data
+
+    @property
+    def dense_meas_data(self):
+        # same as e2sm_kpm_module.extract_meas_data(indication_msg, dense=True)
+        if self._dense_meas_data is None:
+            self._dense_meas_data = self.e2sm_kpm.extract_meas_data(self.indication_msg, dense=True)
+        return self._dense_meas_data
+
 class e2sm_kpm_module(object):
     def __init__(self, parent):
         super(e2sm_kpm_module, self).__init__()
         self.parent = parent
         self.ran_func_id = 2;
-        self.e2sm_kpm_compiler = e2sm_kpm_packer()
+        # the codec is created on first use
+        self._e2sm_kpm_compiler = None
+        self._e2sm_kpm_compiler_lock = threading.Lock()
+
+    @property
+    def e2sm_kpm_compiler(self):
+        if self._e2sm_kpm_compiler is None:
+            with self._e2sm_kpm_compiler_lock:
+                if self._e2sm_kpm_compiler is None:
+                    self._e2sm_kpm_compiler = e2sm_kpm_packer()
+        return self._e2sm_kpm_compiler
 
     def set_ran_func_id(self, ran_func_id):
         self.ran_func_id = ran_func_id
 
-    def subscribe_report_service_style_1(self, e2_node_id, reportingPeriod, metric_names, granulPeriod, indication_callback):
+    def subscribe_report_service_style_1(self, e2_node_id, reportingPeriod, metric_names, granulPeriod, indication_callback, batch_indications=False, lazy_indications=False):
         event_trigger_def = self.e2sm_kpm_compiler.pack_event_trigger_def(reportingPeriod)
         action_def = self.e2sm_kpm_compiler.pack_action_def_format1(metric_names, granulPeriod)
-        self.parent.subscribe(e2_node_id, self.ran_func_id, event_trigger_def, action_def, indication_callback, e2sm_types.E2SM_KPM)
+        return self.parent.subscribe(e2_node_id, self.ran_func_id, event_trigger_def, action_def, indication_callback, e2sm_types.E2SM_KPM, batch_indications, lazy_indications)
 
-    def subscribe_report_service_style_2(self, e2_node_id, reportingPeriod, ue_id, metric_names, granulPeriod, indication_callback):
+    def subscribe_report_service_style_2(self, e2_node_id, reportingPeriod, ue_id, metric_names, granulPeriod, indication_callback, batch_indications=False, lazy_indications=False):
         event_trigger_def = self.e2sm_kpm_compiler.pack_event_trigger_def(reportingPeriod)
         action_def = self.e2sm_kpm_compiler.pack_action_def_format2(ue_id, metric_names, granulPeriod)
-        self.parent.subscribe(e2_node_id, self.ran_func_id, event_trigger_def, action_def, indication_callback, e2sm_types.E2SM_KPM)
+        return self.parent.subscribe(e2_node_id, self.ran_func_id, event_trigger_def, action_def, indication_callback, e2sm_types.E2SM_KPM, batch_indications, lazy_indications)
 
-    def subscribe_report_service_style_3(self, e2_node_id, reportingPeriod, matchingConds, metric_names, granulPeriod, indication_callback):
+    def subscribe_report_service_style_3(self, e2_node_id, reportingPeriod, matchingConds, metric_names, granulPeriod, indication_callback, batch_indications=False, lazy_indications=False):
         event_trigger_def = self.e2sm_kpm_compiler.pack_event_trigger_def(reportingPeriod)
         action_def = self.e2sm_kpm_compiler.pack_action_def_format3(matchingConds, metric_names, granulPeriod)
-        self.parent.subscribe(e2_node_id, self.ran_func_id, event_trigger_def, action_def, indication_callback, e2sm_types.E2SM_KPM)
+        return self.parent.subscribe(e2_node_id, self.ran_func_id, event_trigger_def, action_def, indication_callback, e2sm_types.E2SM_KPM, batch_indications, lazy_indications)
 
-    def subscribe_report_service_style_4(self, e2_node_id, reportingPeriod, matchingUeConds, metric_names, granulPeriod, indication_callback):
+    def subscribe_report_service_style_4(self, e2_node_id, reportingPeriod, matchingUeConds, metric_names, granulPeriod, indication_callback, batch_indications=False, lazy_indications=False):
         event_trigger_def = self.e2sm_kpm_compiler.pack_event_trigger_def(reportingPeriod)
         action_def = self.e2sm_kpm_compiler.pack_action_def_format4(matchingUeConds, metric_names, granulPeriod)
-        self.parent.subscribe(e2_node_id, self.ran_func_id, event_trigger_def, action_def, indication_callback, e2sm_types.E2SM_KPM)
+        return self.parent.subscribe(e2_node_id, self.ran_func_id, event_trigger_def, action_def, indication_callback, e2sm_types.E2SM_KPM, batch_indications, lazy_indications)
 
-    def subscribe_report_service_style_5(self, e2_node_id, reportingPeriod, ue_ids, metric_names, granulPeriod, indication_callback):
+    def subscribe_report_service_style_5(self, e2_node_id, reportingPeriod, ue_ids, metric_names, granulPeriod, indication_callback, batch_indications=False, lazy_indications=False):
         event_trigger_def = self.e2sm_kpm_compiler.pack_event_trigger_def(reportingPeriod)
         action_def = self.e2sm_kpm_compiler.pack_action_def_format5(ue_ids, metric_names, granulPeriod)
-        self.parent.subscribe(e2_node_id, self.ran_func_id, event_trigger_def, action_def, indication_callback, e2sm_types.E2SM_KPM)
+        return self.parent.subscribe(e2_node_id, self.ran_func_id, event_trigger_def, action_def, indication_callback, e2sm_types.E2SM_KPM, batch_indications, lazy_indications)
 
     def unpack_ric_indication(self, ric_indication):
         indication_hdr = self.e2sm_kpm_compiler.unpack_indication_header(ric_indication.indication_header)
@@ -109,7 +266,7 @@ class e2sm_kpm_module(object):
         meas_data_dict = self._extract_meas_data_ind_msg_f1(indication_msg["indicationMessage-formats"][1])
         return meas_data_dict
 
-    def _extract_content_ind_msg_f2(self, indication_msg):
+    def _extract_content_ind_msg_f2(self, indication_msg, dense=False):
         '''
         # example content
         {'indicationMessage-formats': ('indicationMessage-Format2',
@@ -123,48 +280,49 @@ class e2sm_kpm_module(object):
             }
         )}
         '''
-        indication_dict = {}
-        metric_names = []
-        ue_ids = []
-        meas_data_dict = {}
         indication_msg_content = indication_msg["indicationMessage-formats"][1]
         measData = indication_msg_content["measData"]
-        measCondUEidList = indication_msg_content["measCondUEidList"]
         granulPeriod = indication_msg_content.get("granulPeriod", None)
 
-        # extract metric names
-        # Note: currently only 1 metric in indication msg format 2 is supported
-        for measInfoItem in measCondUEidList:
-            metric_name = measInfoItem["measType"][1]
-            matchingCond = measInfoItem["matchingCond"] # copy of the matchingCond from Subscription Request
-            matchingUEidList = measInfoItem.get("matchingUEidList", None) # list of UEs that satisfy the matchingCond
-            matchingUEidPerGP = measInfoItem.get("matchingUEidPerGP", None)
-            metric_names.append(metric_name)
-
-        if matchingUEidList is None:
-            return meas_data_dict
+        # measRecord items are ordered by measCondUEidList item (metric) and then by the UEs matching its condition
+        metric_names = []
+        metric_index = {}
+        ue_ids = []
+        ue_index = {}
+        columns = []  # (ue_id, metric_name) of every measRecord item
+        matchingCond = None
+        for measCondUEidItem in indication_msg_content["measCondUEidList"]:
+            metric_name = measCondUEidItem["measType"][1]
+            if matchingCond is None:
+                matchingCond = measCondUEidItem["matchingCond"] # copy of the matchingCond from Subscription Request
+            if metric_name not in metric_index:
+                metric_index[metric_name] = len(metric_names)
+                metric_names.append(metric_name)
+            # list of UEs that satisfy the matchingCond
+            for matchingUE in measCondUEidItem.get("matchingUEidList", None) or []:
+                ueID = _ue_id_value(matchingUE["ueID"])
+                if ueID not in ue_index:
+                    ue_index[ueID] = len(ue_ids)
+                    ue_ids.append(ueID)
+                columns.append((ueID, metric_name))
 
-        for matchingUE in matchingUEidList:
-            ueID = list(matchingUE["ueID"][1].values())[0]
-            ue_ids.append(ueID)
-            meas_data_dict[ueID] = {"measData" : {}}
-            # for each UE create an entry for each metric_name
-            for metric_name in metric_names:
-                meas_data_dict[ueID]["measData"] = {metric_name : []}
+        if dense:
+            indication_dict = _dense_meas_data(ue_ids, metric_names, len(measData))
+            _fill_dense_values(indication_dict["values"], measData,
+                               [ue_index[ueID] for ueID, metric_name in columns],
+                               [metric_index[metric_name] for ueID, metric_name in columns])
+        else:
+            meas_data_dict = {}
+            # value list of every measRecord item, so the values are appended in a single pass
+            column_values = []
+            for ueID, metric_name in columns:
+                ue_meas_data = meas_data_dict.setdefault(ueID, {"measData": {}})["measData"]
+                column_values.append(ue_meas_data.setdefault(metric_name, []))
+            for measDataItem in measData:
+                for values, measRecordItem in zip(column_values, measDataItem['measRecord']):
+                    values.append(measRecordItem[1])
+            indication_dict = {"ueMeasData": meas_data_dict}
 
-        # map measData to UE and Metric name
-        for measDataItem in measData:
-            measRecord = measDataItem['measRecord']
-            idx = 0
-            for measRecordItem in measRecord:
-                ueID = ue_ids[idx]
-                metric_name = metric_names[0]  # currently only 1 metric supported in format 2
-                valueType = measRecordItem[0]
-                value = measRecordItem[1]
-                meas_data_dict[ueID]["measData"][metric_name].append(value)
-                idx += 1
-
-        indication_dict["ueMeasData"] = meas_data_dict
         indication_dict["matchingCond"] = matchingCond
         # add granulPeriod to dict
         if (granulPeriod is not None):
@@ -172,7 +330,7 @@ class e2sm_kpm_module(object):
 
         return indication_dict
 
-    def _extract_content_ind_msg_f3(self, indication_msg):
+    def _extract_content_ind_msg_f3(self, indication_msg, dense=False):
         '''
         # example content
         {'indicationMessage-formats': ('indicationMessage-Format3', {
@@ -190,6 +348,8 @@ class e2sm_kpm_module(object):
         indication_dict = {}
         meas_data_dict = {}
         ueMeasReportList = indication_msg["indicationMessage-formats"][1]["ueMeasReportList"]
+        if dense:
+            return self._extract_dense_ind_msg_f3(ueMeasReportList)
         for ueMeasReport in ueMeasReportList:
             ueID = list(ueMeasReport["ueID"][1].values())[0]
             measReport = ueMeasReport['measReport']
@@ -198,13 +358,42 @@ class e2sm_kpm_module(object):
         indication_dict["ueMeasData"] = meas_data_dict
         return indication_dict
 
-    def extract_meas_data(self, indication_msg):
+    def _extract_dense_ind_msg_f3(self, ueMeasReportList):
+        ue_ids = []
+        metric_names = []
+        metric_index = {}
+        num_granul_periods = 0
+        granulPeriod = None
+        for ueMeasReport in ueMeasReportList:
+            ue_ids.append(_ue_id_value(ueMeasReport["ueID"]))
+            measReport = ueMeasReport['measReport']
+            num_granul_periods = max(num_granul_periods, len(measReport["measData"]))
+            granulPeriod = measReport.get("granulPeriod", granulPeriod)
+            for measInfoItem in measReport["measInfoList"]:
+                metric_name = measInfoItem["measType"][1]
+                if metric_name not in metric_index:
+                    metric_index[metric_name] = len(metric_names)
+                    metric_names.append(metric_name)
+
+        indication_dict = _dense_meas_data(ue_ids, metric_names, num_granul_periods)
+        values = indication_dict["values"]
+        for ue_idx, ueMeasReport in enumerate(ueMeasReportList):
+            measReport = ueMeasReport['measReport']
+            metric_idx = [metric_index[measInfoItem["measType"][1]] for measInfoItem in measReport["measInfoList"]]
+            _fill_dense_values(values, measReport["measData"], [ue_idx] * len(metric_idx), metric_idx)
+        if (granulPeriod is not None):
+            indication_dict['granulPeriod'] = granulPeriod
+        return indication_dict
+
+    def extract_meas_data(self, indication_msg, dense=False):
+        # dense=True (Format 2 and 3 only, requires numpy): returns {'ueIds': [...], 'metrics': [...],
+        # 'values': array of shape (granularity periods, UEs, metrics)}, missing values are NaN
         meas_data = {}
         indication_msg_format = indication_msg["indicationMessage-formats"][0]
         if indication_msg_format == "indicationMessage-Format1":
             meas_data = self._extract_content_ind_msg_f1(indication_msg)
         elif indication_msg_format == "indicationMessage-Format2":
-            meas_data = self._extract_content_ind_msg_f2(indication_msg)
+            meas_data = self._extract_content_ind_msg_f2(indication_msg, dense)
         elif indication_msg_format == "indicationMessage-Format3":
-            meas_data = self._extract_content_ind_msg_f3(indication_msg)
+            meas_data = self._extract_content_ind_msg_f3(indication_msg, dense)
         return meas_data
\ No newline at end of file
@@ -1,60 +1,149 @@
 import datetime
+import queue
+import threading
+import functools
+import struct
 from enum import Enum
 from .asn1.e2sm_rc_packer import e2sm_rc_packer
 
 
+def aper_length_determinant_size(length):
+    # size of an unconstrained APER length determinant
+    if length < 128:
+        return 1
+    if length < 16384:
+        return 2
+    raise ValueError("APER length {} needs fragmentation, which is not supported".format(length))
+
+def write_aper_length_determinant(buf, offset, length):
+    # writes an unconstrained APER length determinant at offset, returns the offset after it
+    if length < 128:
+        buf[offset] = length
+        return offset + 1
+    struct.pack_into('>H', buf, offset, 0x8000 | length)
+    return offset + 2
+
+def aper_length_determinant(length):
+    # unconstrained APER length determinant as bytes
+    buf = bytearray(aper_length_determinant_size(length))
+    write_aper_length_determinant(buf, 0, length)
+    return bytes(buf)
+
+def read_aper_length_determinant(buf, offset):
+    # returns (length, offset after the length determinant)
+    if buf[offset] & 0x80 == 0:
+        return buf[offset], offset + 1
+    if buf[offset] & 0xc0 == 0x80:
+        return struct.unpack_from('>H', buf, offset)[0] & 0x3fff, offset + 2
+    raise ValueError("APER fragmented length at offset {} is not supported".format(offset))
+
+def parse_ric_request_id(payload):
+    # Returns (ricRequestorID, ricInstanceID) of an E2AP message (e.g. RIC Control Acknowledge/Failure)
+    # by walking its protocolIEs up to the RICrequestID IE (id 29), None if there is none.
+    # skip PDU type, procedureCode and criticality
+    msg_len, offset = read_aper_length_determinant(payload, 3)
+    # extension bit + number of protocolIEs
+    num_ies = struct.unpack_from('>H', payload, offset + 1)[0]
+    offset += 3
+    for _ in range(num_ies):
+        ie_id = struct.unpack_from('>H', payload, offset)[0]
+        ie_len, offset = read_aper_length_determinant(payload, offset + 3)
+        if ie_id == 29:
+            _, requestor_id, instance_id = struct.unpack_from('>BHH', payload, offset)
+            return requestor_id, instance_id
+        offset += ie_len
+    return None
+
+
 class e2sm_rc_module(object):
-    def __init__(self, parent):
+    def __init__(self, parent, control_cache_size=1024):
         super(e2sm_rc_module, self).__init__()
         self.parent = parent
         self.ran_func_id = 3;
-        self.e2sm_rc_compiler = e2sm_rc_packer()
+        # the codec is created on first use
+        self._e2sm_rc_compiler = None
+        self._e2sm_rc_compiler_lock = threading.Lock()
 
         # helper variables
         self.requestorID = 0
+        self.requestorID_lock = threading.Lock()
+
+        # LRU caches of encoded control headers (per UE) and control messages (per ratios/PLMN/S-NSSAI),
+        # xApps usually repeat the same few controls, so most of them skip the ASN.1 encoder
+        self._encode_slice_prb_control_header = functools.lru_cache(maxsize=control_cache_size)(self._pack_slice_prb_control_header)
+        self._encode_slice_prb_control_msg = functools.lru_cache(maxsize=control_cache_size)(self._pack_slice_prb_control_msg)
+
+    @property
+    def e2sm_rc_compiler(self):
+        if self._e2sm_rc_compiler is None:
+            with self._e2sm_rc_compiler_lock:
+                if self._e2sm_rc_compiler is None:
+                    self._e2sm_rc_compiler = e2sm_rc_packer()
+        return self._e2sm_rc_compiler
 
     def set_ran_func_id(self, ran_func_id):
         self.ran_func_id = ran_func_id
 
     def get_requestor_id(self):
-        self.requestorID += 1
-        self.requestorID %= 255
-        return self.requestorID
+        # ricRequestorID is a 16 bit value, used to match RIC_CONTROL_ACK/FAILURE to the request
+        with self.requestorID_lock:
+            self.requestorID = self.requestorID % 65535 + 1
+            return self.requestorID
+
+    def get_requestor_ids(self, count):
+        # count consecutive ricRequestorIDs (wrapping like get_requestor_id) with one lock acquisition
+        with self.requestorID_lock:
+            first = self.requestorID
+            self.requestorID = (first + count - 1) % 65535 + 1
+        return [(first + i) % 65535 + 1 for i in range(count)]
 
-    def _build_ric_control_request(self, control_header, control_msg, ack_request):
-        requestorID = [0x00, self.get_requestor_id()]
-        ran_func_id = [0x00, self.ran_func_id]
+    def _build_ric_control_request(self, control_header, control_msg, ack_request, requestor_id=None):
+        # asn1tools has some issue to generate RIC-Control-Request from asn1 files, therefore we need to build it manually.
+        # The message is written into one buffer of the exact size, lengths >= 128 use two-byte APER length determinants.
         control_header_len = len(control_header)
-        control_mgs_len = len(control_msg)
-        ric_control_ack_request = ack_request
-        # asn1tools has some issue to generate RIC-Control-Request from asn1 files, therefore we need to build it manually
-        total_len = 33 + control_header_len + control_mgs_len
-        msg = [0x00, 0x04, 0x00, total_len, 0x00, 0x00, 0x05, 0x00, 0x1d, 0x00, 0x05, 0x00, *requestorID, 0x00, 0x00, 0x00, 0x05,
-               0x00, 0x02, *ran_func_id, 
-               0x00, 0x16, 0x00, control_header_len+1, control_header_len, *control_header, 
-               0x00, 0x17, 0x00, control_mgs_len+1, control_mgs_len, *control_msg,
-               0x00, 0x15, 0x00, 0x01, ric_control_ack_request  << 6]
-
-        payload = bytes(hex_num for hex_num in msg)
-        return payload
-
-    def send_control_request_style_2_action_6(self, e2_node_id, ue_id, min_prb_ratio, max_prb_ratio, dedicated_prb_ratio, ack_request=1):
-        PLMN = b'00101' # currently not exposed as parameter
-        # S-NSSAI
-        sst = b'1'  # currently not exposed as parameter
-        sd = b'0'   # currently not exposed as parameter
-        
-        print(f"Sending control message with SST: {sst.decode()} and SD: {sd.decode()}")
+        control_msg_len = len(control_msg)
+        # value of the RICcontrolHeader/RICcontrolMessage IEs: OCTET STRING length + octets
+        control_header_ie_len = aper_length_determinant_size(control_header_len) + control_header_len
+        control_msg_ie_len = aper_length_determinant_size(control_msg_len) + control_msg_len
+        # protocolIEs: 3 bytes header, RICrequestID 9, RANfunctionID 6, RICcontrolHeader, RICcontrolMessage, RICcontrolAckRequest 5
+        total_len = (3 + 9 + 6 +
+                     3 + aper_length_determinant_size(control_header_ie_len) + control_header_ie_len +
+                     3 + aper_length_determinant_size(control_msg_ie_len) + control_msg_ie_len +
+                     5)
 
-        
-        # ratios
-        min_prb_policy_ratio = max(0, min(min_prb_ratio, 100))
-        max_prb_policy_ratio = max(0, min(max_prb_ratio, 100))
-        dedicated_prb_policy_ratio = max(0, min(dedicated_prb_ratio, 100))
+        buf = bytearray(3 + aper_length_determinant_size(total_len) + total_len)
+        # initiatingMessage, procedureCode 4 (RICcontrol), criticality reject
+        buf[0:3] = b'\x00\x04\x00'
+        offset = write_aper_length_determinant(buf, 3, total_len)
+        # extension bit + number of protocolIEs
+        struct.pack_into('>BH', buf, offset, 0x00, 5)
+        offset += 3
+        # RICrequestID (id 29): ricRequestorID, ricInstanceID
+        if requestor_id is None:
+            requestor_id = self.get_requestor_id()
+        struct.pack_into('>HBBBHH', buf, offset, 29, 0x00, 5, 0x00, requestor_id, 0)
+        offset += 9
+        # RANfunctionID (id 5)
+        struct.pack_into('>HBBH', buf, offset, 5, 0x00, 2, self.ran_func_id)
+        offset += 6
+        # RICcontrolHeader (id 22) and RICcontrolMessage (id 23)
+        for ie_id, ie_len, value, value_len in ((22, control_header_ie_len, control_header, control_header_len),
+                                                (23, control_msg_ie_len, control_msg, control_msg_len)):
+            struct.pack_into('>HB', buf, offset, ie_id, 0x00)
+            offset = write_aper_length_determinant(buf, offset + 3, ie_len)
+            offset = write_aper_length_determinant(buf, offset, value_len)
+            buf[offset:offset + value_len] = value
+            offset += value_len
+        # RICcontrolAckRequest (id 21)
+        struct.pack_into('>HBBB', buf, offset, 21, 0x00, 1, ack_request << 6)
 
+        return bytes(buf)
+
+    def _pack_slice_prb_control_header(self, ue_id):
         ue_id = ('gNB-DU-UEID', {'gNB-CU-UE-F1AP-ID': ue_id})
-        control_header = self.e2sm_rc_compiler.pack_ric_control_header_f1(style_type=2, control_action_id=6, ue_id_tuple=ue_id)
+        return self.e2sm_rc_compiler.pack_ric_control_header_f1(style_type=2, control_action_id=6, ue_id_tuple=ue_id)
 
+    def _pack_slice_prb_control_msg(self, min_prb_policy_ratio, max_prb_policy_ratio, dedicated_prb_policy_ratio, PLMN, sst, sd):
         control_msg_dict = {'ric-controlMessage-formats': ('controlMessage-Format1',
                                 {'ranP-List': [
                                     {'ranParameter-ID': 1, 'ranParameter-valueType': ('ranP-Choice-List', {'ranParameter-List': {'list-of-ranParameter': [{'sequence-of-ranParameters': [
@@ -70,9 +159,125 @@ class e2sm_rc_module(object):
                                                     {'ranParameter-ID': 11, 'ranParameter-valueType': ('ranP-Choice-ElementFalse', {'ranParameter-value': ('valueInt', max_prb_policy_ratio)})},
                                                     {'ranParameter-ID': 12, 'ranParameter-valueType': ('ranP-Choice-ElementFalse', {'ranParameter-value': ('valueInt', dedicated_prb_policy_ratio)})}]}]}})}]})}
 
-        control_msg = self.e2sm_rc_compiler.pack_ric_control_msg(control_msg_dict)
-        payload = self._build_ric_control_request(control_header, control_msg, ack_request)
-        self.parent.rmr_send(e2_node_id, payload, 12040, retries=1)
+        return self.e2sm_rc_compiler.pack_ric_control_msg(control_msg_dict)
+
+    def get_control_cache_stats(self):
+        header_info = self._encode_slice_prb_control_header.cache_info()
+        msg_info = self._encode_slice_prb_control_msg.cache_info()
+        return {'hits': header_info.hits + msg_info.hits,
+                'misses': header_info.misses + msg_info.misses,
+                'header_cache_size': header_info.currsize,
+                'msg_cache_size': msg_info.currsize}
+
+    def clear_control_cache(self):
+        self._encode_slice_prb_control_header.cache_clear()
+        self._encode_slice_prb_control_msg.cache_clear()
+
+    def _send_control_request(self, e2_node_id, control_header, control_msg, ack_request, ack_callback, ack_timeout, ack_retries):
+        requestor_id = self.get_requestor_id()
+        payload = self._build_ric_control_request(control_header, control_msg, ack_request, requestor_id)
+        return self._send_control_payload(e2_node_id, requestor_id, payload, ack_request, ack_callback, ack_timeout, ack_retries)
+
+    def _send_control_payload(self, e2_node_id, requestor_id, payload, ack_request, ack_callback, ack_timeout, ack_retries):
+        control_tracker = self.parent.control_tracker
+        if ack_request and control_tracker is not None:
+            # register before sending, the ACK might arrive before rmr_send returns
+            control_tracker.register(requestor_id, e2_node_id, payload, ack_timeout, ack_retries, ack_callback)
+        status = self.parent.rmr_send(e2_node_id, payload, 12040, retries=1)
+        if status != 0 and ack_request and control_tracker is not None:
+            control_tracker.cancel(requestor_id, "RMR send failed with state {}".format(status))
+        return status
+
+    def send_control_request_style_2_action_6(self, e2_node_id, ue_id, min_prb_ratio, max_prb_ratio, dedicated_prb_ratio, ack_request=1, PLMN=b'00101', sst=b'1', sd=b'0',
+                                              ack_callback=None, ack_timeout=None, ack_retries=0):
+        # With ack_request, the request is tracked until RIC_CONTROL_ACK/FAILURE or ack_timeout (re-sent up to ack_retries times),
+        # ack_callback(future) gets a Future with the ControlOutcome (see control_tracker.py).
+        # S-NSSAI: sst and sd
+        print(f"Sending control message with SST: {sst.decode()} and SD: {sd.decode()}")
+
+        # ratios
+        min_prb_policy_ratio = max(0, min(min_prb_ratio, 100))
+        max_prb_policy_ratio = max(0, min(max_prb_ratio, 100))
+        dedicated_prb_policy_ratio = max(0, min(dedicated_prb_ratio, 100))
+
+        control_header = self._encode_slice_prb_control_header(ue_id)
+        control_msg = self._encode_slice_prb_control_msg(min_prb_policy_ratio, max_prb_policy_ratio, dedicated_prb_policy_ratio, PLMN, sst, sd)
+        return self._send_control_request(e2_node_id, control_header, control_msg, ack_request, ack_callback, ack_timeout, ack_retries)
+
+    def send_control_request_style_2_action_6_bulk(self, e2_node_id, ue_prb_ratios, ack_request=1, PLMN=b'00101', sst=b'1', sd=b'0',
+                                                   ack_callback=None, ack_timeout=None, ack_retries=0, pipeline_min_ues=32, pipeline_chunk_size=16):
+        # ue_prb_ratios: list of (ue_id, min_prb_ratio, max_prb_ratio, dedicated_prb_ratio) tuples for the E2 node
+        # Returns a list of (ue_id, RMR state) tuples.
+        # The parts of the RIC Control Request shared by the UEs are built once per call: RANfunctionID IE and, per distinct
+        # ratios, the RICcontrolMessage IE with the RICcontrolAckRequest IE. Only the RICrequestID and RICcontrolHeader IEs
+        # are per UE. From pipeline_min_ues UEs on, the requests are sent by a sender thread while the next ones are built
+        # (in chunks of pipeline_chunk_size requests), RMR sends do not hold the GIL. Requests are sent in the order of ue_prb_ratios.
+        print(f"Sending {len(ue_prb_ratios)} control messages with SST: {sst.decode()} and SD: {sd.decode()}")
+
+        ran_function_ie = struct.pack('>HBBH', 5, 0x00, 2, self.ran_func_id)
+        ack_request_ie = struct.pack('>HBBB', 21, 0x00, 1, ack_request << 6)
+        msg_ies = {}
+        requestor_ids = self.get_requestor_ids(len(ue_prb_ratios))
+
+        def build(idx):
+            ue_id, min_prb_ratio, max_prb_ratio, dedicated_prb_ratio = ue_prb_ratios[idx]
+            ratios = (max(0, min(min_prb_ratio, 100)), max(0, min(max_prb_ratio, 100)), max(0, min(dedicated_prb_ratio, 100)))
+            tail = msg_ies.get(ratios, None)
+            if tail is None:
+                control_msg = self._encode_slice_prb_control_msg(*ratios, PLMN, sst, sd)
+                msg_ie_len = aper_length_determinant_size(len(control_msg)) + len(control_msg)
+                tail = b''.join((struct.pack('>HB', 23, 0x00), aper_length_determinant(msg_ie_len), aper_length_determinant(len(control_msg)),
+                                 control_msg, ack_request_ie))
+                msg_ies[ratios] = tail
+            control_header = self._encode_slice_prb_control_header(ue_id)
+            header_ie_len = aper_length_determinant_size(len(control_header)) + len(control_header)
+            header_ie = b''.join((struct.pack('>HB', 22, 0x00), aper_length_determinant(header_ie_len), aper_length_determinant(len(control_header)),
+                                  control_header))
+            total_len = 3 + 9 + len(ran_function_ie) + len(header_ie) + len(tail)
+            payload = b''.join((b'\x00\x04\x00', aper_length_determinant(total_len), b'\x00\x00\x05',
+                                struct.pack('>HBBBHH', 29, 0x00, 5, 0x00, requestor_ids[idx], 0), ran_function_ie, header_ie, tail))
+            return ue_id, requestor_ids[idx], payload
+
+        def send(ue_id, requestor_id, payload):
+            return self._send_control_payload(e2_node_id, requestor_id, payload, ack_request, ack_callback, ack_timeout, ack_retries)
+
+        if len(ue_prb_ratios) < pipeline_min_ues:
+            results = []
+            for idx in range(len(ue_prb_ratios)):
+                ue_id, requestor_id, payload = build(idx)
+                results.append((ue_id, send(ue_id, requestor_id, payload)))
+            return results
+
+        results = []
+        errors = []
+        # chunks of built requests, handing over every request on its own costs more than building it
+        send_queue = queue.Queue(maxsize=8)
+
+        def sender():
+            while True:
+                chunk = send_queue.get()
+                if chunk is None:
+                    return
+                for ue_id, requestor_id, payload in chunk:
+                    try:
+                        results.append((ue_id, send(ue_id, requestor_id, payload)))
+                    except Exception as e:
+                        errors.append(e)
+                        results.append((ue_id, None))
+
+        sender_thread = threading.Thread(target=sender, name="rc-control-sender")
+        sender_thread.daemon = True
+        sender_thread.start()
+        try:
+            for start in range(0, len(ue_prb_ratios), pipeline_chunk_size):
+                send_queue.put([build(idx) for idx in range(start, min(start + pipeline_chunk_size, len(ue_prb_ratios)))])
+        finally:
+            send_queue.put(None)
+            sender_thread.join()
+        if errors:
+            raise errors[0]
+        return results
 
     # Alias with a nice name
     control_slice_level_prb_quota = send_control_request_style_2_action_6
+    control_slice_level_prb_quota_bulk = send_control_request_style_2_action_6_bulk
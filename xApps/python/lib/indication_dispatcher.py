@@ -0,0 +1,125 @@
+import threading
+from collections import deque
+from enum import Enum
+
+
+class overflow_policy(Enum):
+    BLOCK = 0        # receive loop waits until the worker queue has space
+    DROP_OLDEST = 1  # discard the oldest queued indication to make space
+    DROP_NEWEST = 2  # discard the indication that does not fit
+
+
+class _WorkerQueue(object):
+    def __init__(self, max_size):
+        super(_WorkerQueue, self).__init__()
+        self.max_size = max_size
+        self.items = deque()
+        self.cond = threading.Condition()
+
+
+class IndicationDispatcher(object):
+    '''
+    Hands RIC indications from the RMR receive loop to a pool of worker threads.
+    Every key (subscription ID) is always served by the same worker, so indications
+    of a single subscription are processed in the order they were received.
+    '''
+    def __init__(self, num_workers=4, queue_size=1000, policy=overflow_policy.BLOCK):
+        super(IndicationDispatcher, self).__init__()
+        self.num_workers = max(1, num_workers)
+        self.policy = policy
+        # total queue capacity is split between workers
+        per_worker_size = max(1, queue_size // self.num_workers)
+        self.queues = [_WorkerQueue(per_worker_size) for _ in range(self.num_workers)]
+        self.workers = []
+        self.running = False
+
+        # counters
+        self.stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.processed = 0
+        self.dropped_oldest = 0
+        self.dropped_newest = 0
+        self.max_queue_depth = 0
+        self.callback_errors = 0
+
+    def start(self):
+        self.running = True
+        for idx, worker_queue in enumerate(self.queues):
+            worker = threading.Thread(target=self._worker_loop, args=(worker_queue,), name="indication-worker-{}".format(idx))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        for worker_queue in self.queues:
+            with worker_queue.cond:
+                worker_queue.cond.notify_all()
+        for worker in self.workers:
+            worker.join(timeout)
+        self.workers = []
+
+    def dispatch(self, key, func, *args):
+        worker_queue = self.queues[hash(key) % self.num_workers]
+        with worker_queue.cond:
+            if len(worker_queue.items) >= worker_queue.max_size:
+                if self.policy == overflow_policy.DROP_NEWEST:
+                    with self.stats_lock:
+                        self.dropped_newest += 1
+                    return False
+                elif self.policy == overflow_policy.DROP_OLDEST:
+                    worker_queue.items.popleft()
+                    with self.stats_lock:
+                        self.dropped_oldest += 1
+                else:
+                    while self.running and len(worker_queue.items) >= worker_queue.max_size:
+                        worker_queue.cond.wait(0.1)
+                    if not self.running:
+                        return False
+
+            worker_queue.items.append((func, args))
+            worker_queue.cond.notify_all()
+
+        with self.stats_lock:
+            self.enqueued += 1
+            depth = self.get_queue_depth()
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+        return True
+
+    def _worker_loop(self, worker_queue):
+        while self.running:
+            with worker_queue.cond:
+                while self.running and not worker_queue.items:
+                    worker_queue.cond.wait(0.1)
+                if not self.running:
+                    return
+                func, args = worker_queue.items.popleft()
+                # wake up the receive loop if it is blocked on a full queue
+                worker_queue.cond.notify_all()
+
+            try:
+                func(*args)
+            except Exception as e:
+                with self.stats_lock:
+                    self.callback_errors += 1
+                print("Error in indication worker: {}".format(e))
+
+            with self.stats_lock:
+                self.processed += 1
+
+    def get_queue_depth(self):
+        return sum(len(worker_queue.items) for worker_queue in self.queues)
+
+    def get_stats(self):
+        with self.stats_lock:
+            return {
+                'queue_depth': self.get_queue_depth(),
+                'max_queue_depth': self.max_queue_depth,
+                'enqueued': self.enqueued,
+                'processed': self.processed,
+                'dropped_oldest': self.dropped_oldest,
+                'dropped_newest': self.dropped_newest,
+                'dropped': self.dropped_oldest + self.dropped_newest,
+                'callback_errors': self.callback_errors,
+            }
@@ -0,0 +1,182 @@
+import bisect
+import threading
+from collections import deque
+
+from .e2sm_kpm_module import collet_start_time_ms, iter_meas_samples
+
+# default histogram bucket bounds for approximate quantiles: 0 and 1 .. 1e9 with 10 buckets per decade
+DEFAULT_QUANTILE_BOUNDS = [0.0] + [10 ** (i / 10.0) for i in range(0, 91)]
+
+
+class SlidingWindowStats(object):
+    '''
+    Count, sum, mean, min, max and approximate quantiles of the samples of the last window_ms
+    (relative to the newest sample's timestamp, optionally at most max_samples), plus an EWMA of all samples.
+    Adding a sample is amortized O(1): min/max are kept in monotonic deques and quantiles are estimated
+    from a histogram whose bucket counts are updated on insertion and eviction.
+    '''
+    def __init__(self, window_ms=10000, max_samples=None, ewma_alpha=0.1, quantile_bounds=DEFAULT_QUANTILE_BOUNDS):
+        super(SlidingWindowStats, self).__init__()
+        self.window_ms = window_ms
+        self.max_samples = max_samples
+        self.ewma_alpha = ewma_alpha
+        self.quantile_bounds = quantile_bounds
+        self.samples = deque()      # (timestamp_ms, seq, value, bucket)
+        self.min_deque = deque()    # (seq, value), increasing values
+        self.max_deque = deque()    # (seq, value), decreasing values
+        self.histogram = [0] * (len(quantile_bounds) + 1)
+        self.seq = 0
+        self.sum = 0.0
+        self.ewma = None
+        self.total_count = 0
+
+    def add(self, timestamp_ms, value):
+        value = float(value)
+        seq = self.seq
+        self.seq += 1
+        bucket = bisect.bisect_left(self.quantile_bounds, value)
+        self.samples.append((timestamp_ms, seq, value, bucket))
+        self.histogram[bucket] += 1
+        self.sum += value
+        self.total_count += 1
+
+        while self.min_deque and self.min_deque[-1][1] >= value:
+            self.min_deque.pop()
+        self.min_deque.append((seq, value))
+        while self.max_deque and self.max_deque[-1][1] <= value:
+            self.max_deque.pop()
+        self.max_deque.append((seq, value))
+
+        if self.ewma is None:
+            self.ewma = value
+        else:
+            self.ewma += self.ewma_alpha * (value - self.ewma)
+
+        self._evict(timestamp_ms - self.window_ms)
+
+    def _evict(self, oldest_ms):
+        samples = self.samples
+        while samples and (samples[0][0] <= oldest_ms or (self.max_samples is not None and len(samples) > self.max_samples)):
+            timestamp_ms, seq, value, bucket = samples.popleft()
+            self.histogram[bucket] -= 1
+            self.sum -= value
+            if self.min_deque[0][0] == seq:
+                self.min_deque.popleft()
+            if self.max_deque[0][0] == seq:
+                self.max_deque.popleft()
+        if not samples:
+            self.sum = 0.0 # avoid accumulating floating point errors
+
+    @property
+    def count(self):
+        return len(self.samples)
+
+    @property
+    def mean(self):
+        return self.sum / len(self.samples) if self.samples else None
+
+    @property
+    def min(self):
+        return self.min_deque[0][1] if self.min_deque else None
+
+    @property
+    def max(self):
+        return self.max_deque[0][1] if self.max_deque else None
+
+    def quantile(self, q):
+        # linear interpolation inside the histogram bucket containing the q-quantile, clipped to [min, max]
+        if not self.samples:
+            return None
+        target = q * len(self.samples)
+        cumulative = 0
+        for bucket, bucket_count in enumerate(self.histogram):
+            if bucket_count == 0 or cumulative + bucket_count < target:
+                cumulative += bucket_count
+                continue
+            lower = self.quantile_bounds[bucket - 1] if bucket > 0 else self.min
+            upper = self.quantile_bounds[bucket] if bucket < len(self.quantile_bounds) else self.max
+            lower = min(max(lower, self.min), self.max)
+            upper = min(max(upper, self.min), self.max)
+            return lower + (upper - lower) * (target - cumulative) / bucket_count
+        return self.max
+
+    def snapshot(self, quantiles=(0.5, 0.9, 0.99)):
+        result = {'count': self.count, 'sum': self.sum, 'mean': self.mean, 'min': self.min, 'max': self.max, 'ewma': self.ewma}
+        for q in quantiles:
+            result['p{:g}'.format(q * 100)] = self.quantile(q)
+        return result
+
+
+class KpmAggregator(object):
+    '''
+    Sliding-window aggregates of E2SM-KPM measurements, updated incrementally from the decoded indications.
+    Statistics are kept per (E2 node ID, UE ID, metric name), UE ID is None for node-level measurements (Format 1),
+    and per (E2 node ID, metric name) over all UEs of the E2 node.
+
+    Example:
+        aggregator = xapp.enable_kpm_aggregates(window_ms=5000)
+        ...
+        if aggregator.get_ue_stats(e2_node_id, ue_id, 'DRB.UEThpDl')['p90'] < threshold:
+            ...
+    '''
+    def __init__(self, window_ms=10000, max_samples=None, ewma_alpha=0.1, quantile_bounds=DEFAULT_QUANTILE_BOUNDS):
+        super(KpmAggregator, self).__init__()
+        self.window_ms = window_ms
+        self.max_samples = max_samples
+        self.ewma_alpha = ewma_alpha
+        self.quantile_bounds = sorted(quantile_bounds)
+        self.lock = threading.Lock()
+        self.ue_stats = {}
+        self.metric_stats = {}
+
+    def _get_or_create(self, stats_dict, key):
+        stats = stats_dict.get(key, None)
+        if stats is None:
+            stats = SlidingWindowStats(self.window_ms, self.max_samples, self.ewma_alpha, self.quantile_bounds)
+            stats_dict[key] = stats
+        return stats
+
+    def add_samples(self, e2_node_id, ue_id, metric_name, timestamp_ms, values, granulPeriod=None):
+        # values are consecutive samples, granulPeriod ms apart, starting at timestamp_ms,
+        # None (noValue records) only advances the timestamp
+        samples = [(timestamp_ms + idx * (granulPeriod or 0), value) for idx, value in enumerate(values) if value is not None]
+        if not samples:
+            return
+        with self.lock:
+            ue_stats = self._get_or_create(self.ue_stats, (e2_node_id, ue_id, metric_name))
+            metric_stats = self._get_or_create(self.metric_stats, (e2_node_id, metric_name))
+            for sample_timestamp_ms, value in samples:
+                ue_stats.add(sample_timestamp_ms, value)
+                metric_stats.add(sample_timestamp_ms, value)
+
+    def on_indication(self, e2_agent_id, subscription_id, indication_hdr, indication_msg):
+        # KPM indication sink (see xAppBase.add_kpm_sink)
+        start_ms = collet_start_time_ms(indication_hdr)
+        for ue_id, metric_name, granulPeriod, values in iter_meas_samples(indication_msg):
+            self.add_samples(e2_agent_id, ue_id, metric_name, start_ms, values, granulPeriod)
+
+    def get_ue_stats(self, e2_node_id, ue_id, metric_name, quantiles=(0.5, 0.9, 0.99)):
+        with self.lock:
+            stats = self.ue_stats.get((e2_node_id, ue_id, metric_name), None)
+            return None if stats is None else stats.snapshot(quantiles)
+
+    def get_metric_stats(self, e2_node_id, metric_name, quantiles=(0.5, 0.9, 0.99)):
+        with self.lock:
+            stats = self.metric_stats.get((e2_node_id, metric_name), None)
+            return None if stats is None else stats.snapshot(quantiles)
+
+    def get_ue_quantile(self, e2_node_id, ue_id, metric_name, q):
+        with self.lock:
+            stats = self.ue_stats.get((e2_node_id, ue_id, metric_name), None)
+            return None if stats is None else stats.quantile(q)
+
+    def remove(self, e2_node_id, ue_id=None):
+        # drops the statistics of an E2 node or only of one of its UEs
+        with self.lock:
+            for key in list(self.ue_stats.keys()):
+                if key[0] == e2_node_id and ue_id in (None, key[1]):
+                    del self.ue_stats[key]
+            if ue_id is None:
+                for key in list(self.metric_stats.keys()):
+                    if key[0] == e2_node_id:
+                        del self.metric_stats[key]
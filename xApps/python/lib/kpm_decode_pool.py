@@ -0,0 +1,101 @@
+import os
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from .asn1.e2sm_kpm_packer import e2sm_kpm_packer
+
+# E2SM-KPM codec of a decoder process, created once by the process initializer
+_worker_packer = None
+
+
+def _init_worker():
+    global _worker_packer
+    _worker_packer = e2sm_kpm_packer()
+
+
+def _decode_indication(indication_header, indication_message):
+    indication_hdr = _worker_packer.unpack_indication_header(indication_header)
+    indication_msg = _worker_packer.unpack_indication_message(indication_message)
+    return indication_hdr, indication_msg
+
+
+class KpmDecodePool(object):
+    '''
+    Decodes E2SM-KPM indication headers/messages in a pool of processes, so decoding is not limited by the GIL.
+    Indications are sharded by a key (E2 node ID), every shard is a single decoder process.
+    Results submitted with a callback are delivered from one delivery thread of the pool in submission order,
+    therefore indications of the same E2 node are returned in order and callbacks never run concurrently
+    or on the executors' internal threads.
+    '''
+    def __init__(self, num_workers=None, max_pending=1000):
+        super(KpmDecodePool, self).__init__()
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        self.num_workers = max(1, num_workers)
+        # spawn instead of fork, the xApp process already runs RMR and HTTP server threads
+        mp_context = multiprocessing.get_context('spawn')
+        self.shards = [ProcessPoolExecutor(max_workers=1, mp_context=mp_context, initializer=_init_worker) for _ in range(self.num_workers)]
+        # limits the number of indications waiting for decoding or delivery
+        self.pending = threading.BoundedSemaphore(max_pending)
+        # (future, callback) in submission order, (None, func) for calls after the preceding deliveries
+        self.deliveries = queue.Queue()
+        self.delivery_thread = threading.Thread(target=self._delivery_loop, name="kpm-decode-delivery")
+        self.delivery_thread.daemon = True
+        self.delivery_thread.start()
+
+    def submit(self, shard_key, indication_header, indication_message, callback=None):
+        # Returns a Future with the decoded (indication_hdr, indication_msg) tuple. With a callback,
+        # callback(decoded, error) is called from the delivery thread once the indication is decoded.
+        self.pending.acquire()
+        shard = self.shards[hash(shard_key) % self.num_workers]
+        try:
+            future = shard.submit(_decode_indication, indication_header, indication_message)
+        except Exception:
+            self.pending.release()
+            raise
+        if callback is None:
+            future.add_done_callback(self._release)
+        else:
+            self.deliveries.put((future, callback))
+        return future
+
+    def call_after_deliveries(self, func):
+        # func() is called from the delivery thread after the callbacks of all indications submitted before
+        self.deliveries.put((None, func))
+
+    def _release(self, future):
+        self.pending.release()
+
+    def _delivery_loop(self):
+        while True:
+            future, callback = self.deliveries.get()
+            if callback is None:
+                return
+            if future is None:
+                try:
+                    callback()
+                except Exception as e:
+                    print("Error in KPM decode pool delivery: {}".format(e))
+                continue
+            try:
+                decoded, error = future.result(), None
+            except Exception as e:
+                decoded, error = None, e
+            try:
+                callback(decoded, error)
+            except Exception as e:
+                print("Error in KPM decode pool delivery: {}".format(e))
+            finally:
+                # released after delivery, so slow callbacks throttle the submission of new indications
+                self.pending.release()
+
+    def decode(self, shard_key, indication_header, indication_message):
+        return self.submit(shard_key, indication_header, indication_message).result()
+
+    def shutdown(self, wait=True):
+        self.deliveries.put((None, None))
+        for shard in self.shards:
+            shard.shutdown(wait=wait)
+        if wait:
+            self.delivery_thread.join()
@@ -0,0 +1,111 @@
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .e2sm_kpm_module import collet_start_time_ms, iter_meas_samples
+
+
+class _RingBuffer(object):
+    # Every sample is written twice (at pos and pos + capacity), so the latest n samples
+    # are always contiguous in memory and can be returned as views without copying.
+    def __init__(self, capacity, dtype):
+        super(_RingBuffer, self).__init__()
+        self.capacity = capacity
+        self.timestamps = np.zeros(2 * capacity, dtype=np.int64)
+        self.values = np.zeros(2 * capacity, dtype=dtype)
+        self.head = 0   # next write position
+        self.size = 0
+
+    def append(self, timestamps, values):
+        if len(values) > self.capacity:
+            timestamps = timestamps[-self.capacity:]
+            values = values[-self.capacity:]
+        idx = (self.head + np.arange(len(values))) % self.capacity
+        self.timestamps[idx] = timestamps
+        self.timestamps[idx + self.capacity] = timestamps
+        self.values[idx] = values
+        self.values[idx + self.capacity] = values
+        self.head = (self.head + len(values)) % self.capacity
+        self.size = min(self.size + len(values), self.capacity)
+
+    def latest(self, num_samples):
+        end = self.head + self.capacity
+        start = end - min(num_samples, self.size)
+        return self.timestamps[start:end], self.values[start:end]
+
+
+class KpmMeasStore(object):
+    '''
+    Bounded in-memory history of E2SM-KPM measurements.
+
+    Keeps one fixed-capacity NumPy ring buffer per (E2 node ID, UE ID, metric name) with a parallel int64
+    column of sample timestamps in ms since the Unix epoch (colletStartTime + n * granulPeriod).
+    UE ID is None for node-level measurements (Format 1).
+    get_window returns views into the ring buffer, they are only valid until the next samples are added.
+
+    Example:
+        meas_store = xapp.enable_meas_store(capacity=600)
+        timestamps, values = meas_store.get_window('gnbd_001_001_00019b_0', 0, 'DRB.UEThpDl', last_ms=10000)
+    '''
+    def __init__(self, capacity=1024, dtype='float64'):
+        super(KpmMeasStore, self).__init__()
+        if np is None:
+            raise ImportError("KpmMeasStore requires numpy, install it with: pip install numpy")
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self.lock = threading.Lock()
+        self.buffers = {}
+
+    def add_samples(self, e2_node_id, ue_id, metric_name, timestamps_ms, values):
+        key = (e2_node_id, ue_id, metric_name)
+        with self.lock:
+            ring_buffer = self.buffers.get(key, None)
+            if ring_buffer is None:
+                ring_buffer = _RingBuffer(self.capacity, self.dtype)
+                self.buffers[key] = ring_buffer
+            ring_buffer.append(timestamps_ms, values)
+
+    def on_indication(self, e2_agent_id, subscription_id, indication_hdr, indication_msg):
+        # KPM indication sink (see xAppBase.add_kpm_sink)
+        start_ms = collet_start_time_ms(indication_hdr)
+        for ue_id, metric_name, granulPeriod, values in iter_meas_samples(indication_msg):
+            # noValue records (None) are dropped, the timestamps of the following samples are kept
+            samples = [(idx, value) for idx, value in enumerate(values) if value is not None]
+            if not samples:
+                continue
+            timestamps_ms = start_ms + np.array([idx for idx, _ in samples], dtype=np.int64) * (granulPeriod or 0)
+            self.add_samples(e2_agent_id, ue_id, metric_name, timestamps_ms, [value for _, value in samples])
+
+    def get_window(self, e2_node_id, ue_id, metric_name, num_samples=None, last_ms=None):
+        # Returns (timestamps_ms, values) views of the latest num_samples samples (default: all stored samples),
+        # optionally limited to the samples not older than last_ms before the newest sample.
+        with self.lock:
+            ring_buffer = self.buffers.get((e2_node_id, ue_id, metric_name), None)
+            if ring_buffer is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=self.dtype)
+            timestamps, values = ring_buffer.latest(ring_buffer.capacity if num_samples is None else num_samples)
+
+        if last_ms is not None and len(timestamps) > 0:
+            start = np.searchsorted(timestamps, timestamps[-1] - last_ms, side='left')
+            timestamps, values = timestamps[start:], values[start:]
+        return timestamps, values
+
+    def keys(self):
+        with self.lock:
+            return list(self.buffers.keys())
+
+    def remove(self, e2_node_id, ue_id=None, metric_name=None):
+        # drops the buffers of an E2 node, optionally only of one UE and/or metric
+        with self.lock:
+            for key in list(self.buffers.keys()):
+                if key[0] == e2_node_id and ue_id in (None, key[1]) and metric_name in (None, key[2]):
+                    del self.buffers[key]
+
+    def get_stats(self):
+        with self.lock:
+            return {'buffers': len(self.buffers),
+                    'samples': sum(ring_buffer.size for ring_buffer in self.buffers.values()),
+                    'memory_bytes': sum(ring_buffer.timestamps.nbytes + ring_buffer.values.nbytes for ring_buffer in self.buffers.values())}
@@ -0,0 +1,40 @@
+import threading
+from ricxappframe.xapp_frame import rmr
+
+
+class RmrSendBufferPool(object):
+    '''
+    Pool of pre-allocated RMR send buffers, so sending does not allocate a new RMR message every time.
+    Payloads bigger than the pool buffer size get a dedicated buffer which is freed after the send.
+    '''
+    def __init__(self, rmr_client, pool_size=8, buffer_size=2000):
+        super(RmrSendBufferPool, self).__init__()
+        self.rmr_client = rmr_client
+        self.pool_size = pool_size
+        self.buffer_size = buffer_size
+        self.lock = threading.Lock()
+        self.free_bufs = [rmr.rmr_alloc_msg(self.rmr_client, self.buffer_size) for _ in range(self.pool_size)]
+
+    def get(self, payload_len):
+        if payload_len <= self.buffer_size:
+            with self.lock:
+                if self.free_bufs:
+                    return self.free_bufs.pop()
+            # all pooled buffers are in use, allocate another one that will be returned to the pool
+            return rmr.rmr_alloc_msg(self.rmr_client, self.buffer_size)
+        return rmr.rmr_alloc_msg(self.rmr_client, payload_len)
+
+    def put(self, sbuf):
+        # RMR might return a different buffer after sending, only keep buffers that are large enough
+        if rmr.rmr_payload_size(sbuf) >= self.buffer_size:
+            with self.lock:
+                if len(self.free_bufs) < self.pool_size:
+                    self.free_bufs.append(sbuf)
+                    return
+        rmr.rmr_free_msg(sbuf)
+
+    def free_all(self):
+        with self.lock:
+            for sbuf in self.free_bufs:
+                rmr.rmr_free_msg(sbuf)
+            self.free_bufs = []
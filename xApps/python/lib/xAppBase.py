@@ -3,14 +3,28 @@ import time
 import json
 import logging
 import threading
+import functools
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 import ricxappframe
 from ricxappframe.xapp_frame import rmr
 import ricxappframe.xapp_subscribe as subscribe
 import ricxappframe.xapp_rest as ricrest
+from ricxappframe.subsclient.rest import ApiException
 from ricxappframe.e2ap.asn1 import IndicationMsg
-from .e2sm_kpm_module import e2sm_types, e2sm_kpm_module
-from .e2sm_rc_module import e2sm_rc_module
+from .e2sm_kpm_module import e2sm_types, e2sm_kpm_module, LazyKpmIndication
+from .e2sm_rc_module import e2sm_rc_module, parse_ric_request_id
+from .indication_dispatcher import IndicationDispatcher, overflow_policy
+from .rmr_send_pool import RmrSendBufferPool
+from .kpm_decode_pool import KpmDecodePool
+from .kpm_meas_store import KpmMeasStore
+from .kpm_aggregates import KpmAggregator
+from .control_tracker import ControlRequestTracker
+
+
+# per-request result of subscribe_bulk/unsubscribe_bulk, error is None on success
+SubscriptionResult = namedtuple('SubscriptionResult', ['e2_node_id', 'subscription_id', 'error'])
 
 
 class SubscriptionWrapper(object):
@@ -20,10 +34,25 @@ class SubscriptionWrapper(object):
         self.subscription_id = None
         self.e2_event_instance_id = None  # Subscription ID used in RIC indication msgs
         self.callback_func = None
+        self.batch_indications = False  # if True, callback_func receives a list of indications
+        self.lazy_indications = False  # if True, E2SM-KPM callbacks receive a LazyKpmIndication instead of the decoded header and message
+        self.registry_key = None  # key of identical subscription requests sharing this E2 subscription
+        self.consumers = []  # IndicationConsumer of every subscriber, callback_func fans out to them if there are several
+        self.fan_out = False
+
+class IndicationConsumer(object):
+    def __init__(self, callback_func, batch_indications):
+        super(IndicationConsumer, self).__init__()
+        self.callback_func = callback_func
+        self.batch_indications = batch_indications
 
 class xAppBase(object):
-    def __init__(self, config=None, http_server_port=8090, rmr_port=4560, rmr_flags=0x00):
+    def __init__(self, config=None, http_server_port=8090, rmr_port=4560, rmr_flags=0x00, rmr_ready_timeout=None, preload_codecs=False):
         super(xAppBase, self).__init__()
+        # per-phase startup durations in seconds, filled during __init__
+        self.startup_report = {}
+        self._startup_time = time.monotonic()
+        self._startup_phase_time = self._startup_time
         # Default Config
         self.xAPP_IP = "10.0.2.20"
         self.MY_HTTP_SERVER_ADDRESS = "0.0.0.0"     # bind to all interfaces
@@ -40,31 +69,88 @@ class xAppBase(object):
         self.e2sm_rc = e2sm_rc_module(self)
         # dict to store active subscriptions
         self.my_subscriptions = {}
+        # identical subscription requests share one E2 subscription (see subscribe)
+        self.share_subscriptions = True
+        self.shared_subscriptions = {}
+        self.shared_subscription_hits = 0
+        self.subscription_lock = threading.RLock()
 
         # helper variables
         self.running = False
-        
+        # optional worker pool for RIC indication callbacks (see enable_indication_workers)
+        self.indication_dispatcher = None
+        # number of RIC indications dropped because they belong to subscriptions of other xApps
+        self.filtered_indications = 0
+        # batch receive mode (see enable_batch_receive)
+        self.batch_receive = False
+        self.max_batch_size = 64
+        self.max_batch_wait_ms = 10
+        # optional process pool for E2SM-KPM decoding (see enable_kpm_decode_pool)
+        self.kpm_decode_pool = None
+        # functions called with every decoded E2SM-KPM indication (see add_kpm_sink), e.g. the measurement store
+        self.kpm_sinks = []
+        self.meas_store = None
+        self.kpm_aggregator = None
+        # outstanding RIC control requests waiting for RIC_CONTROL_ACK/FAILURE
+        self.control_tracker = ControlRequestTracker(self._resend_control_request)
+
         # Initialize RMR client.
+        # RMR loads the route table in its own thread, so the REST/HTTP setup below overlaps with waiting for it.
         initbind = str(self.MY_RMR_PORT).encode('utf-8')
         self.rmr_client = rmr.rmr_init(initbind, rmr.RMR_MAX_RCV_BYTES, rmr_flags) # flag: do not start an additional route collector thread
-        while rmr.rmr_ready(self.rmr_client) == 0:
-            time.sleep(1)
+        self._log_startup_phase('rmr_init')
 
-        rmr.rmr_set_stimeout(self.rmr_client, 1)
-        self.rmr_sbuf = rmr.rmr_alloc_msg(self.rmr_client, 2000)
-        time.sleep(0.1)
+        # E2SM codecs are created on first use, optionally warm them up in the background
+        if preload_codecs:
+            codec_thread = threading.Thread(target=self._preload_codecs, name="codec-preload")
+            codec_thread.daemon = True
+            codec_thread.start()
 
         # Initialize Subscriber to talk to Subscription Manager over REST API
         self.subscriber = subscribe.NewSubscriber(self.SUB_MGR_URI)
 
         # Initialize subEndPoint with my IP and ports
         self.subEndPoint = self.subscriber.SubscriptionParamsClientEndpoint(self.xAPP_IP, self.MY_HTTP_SERVER_PORT, self.MY_RMR_PORT)
+        self._log_startup_phase('subscriber')
 
         # Create a HTTP server and set the URI handler callbacks
         self.httpServer = ricrest.ThreadedHTTPServer(self.MY_HTTP_SERVER_ADDRESS, self.MY_HTTP_SERVER_PORT)
         if self.subscriber.ResponseHandler(self._subscription_response_callback, self.httpServer) is not True:
             print("Error when trying to set the subscription reponse callback")
         self.httpServer.start()
+        self._log_startup_phase('http_server')
+
+        rmr_ready_deadline = None if rmr_ready_timeout is None else time.monotonic() + rmr_ready_timeout
+        while rmr.rmr_ready(self.rmr_client) == 0:
+            if rmr_ready_deadline is not None and time.monotonic() > rmr_ready_deadline:
+                print("RMR route table not received within {} s, continuing without it".format(rmr_ready_timeout))
+                break
+            time.sleep(0.01)
+        self._log_startup_phase('rmr_ready')
+
+        rmr.rmr_set_stimeout(self.rmr_client, 1)
+        # pre-allocated send buffers, reused by rmr_send
+        self.rmr_send_pool = RmrSendBufferPool(self.rmr_client, pool_size=8, buffer_size=2000)
+        self.rmr_send_lock = threading.Lock()
+        self.rmr_send_stats = {'sent': 0, 'failed': 0, 'retries': 0}
+        self._log_startup_phase('rmr_send_pool')
+
+        self.startup_report['total'] = time.monotonic() - self._startup_time
+        startup_phases = dict(self.startup_report) # snapshot, the codec preload thread might still add its entry
+        print("xApp startup took {:.3f} s ({})".format(startup_phases.pop('total'),
+              ", ".join("{}: {:.3f} s".format(phase, duration) for phase, duration in startup_phases.items())))
+
+    def _log_startup_phase(self, phase):
+        now = time.monotonic()
+        self.startup_report[phase] = now - self._startup_phase_time
+        self._startup_phase_time = now
+
+    def _preload_codecs(self):
+        start = time.monotonic()
+        self.e2sm_kpm.e2sm_kpm_compiler
+        self.e2sm_rc.e2sm_rc_compiler
+        # runs in parallel to the other phases, so it is not part of the total
+        self.startup_report['codecs_preload'] = time.monotonic() - start
 
     @classmethod
     def start_function(cls, fun):
@@ -83,16 +169,32 @@ class xAppBase(object):
         SubscriptionId = data['SubscriptionId']
         E2EventInstanceId = data['SubscriptionInstances'][0]["E2EventInstanceId"]  # subscription ID used in RIC indication
         print("Received Subscription ID to E2EventInstanceId mapping: {} -> {}".format(SubscriptionId, E2EventInstanceId))
-        if SubscriptionId in self.my_subscriptions:
-            self.my_subscriptions[SubscriptionId].e2_event_instance_id = E2EventInstanceId
-            # update the key, as it is more convenient to use E2EventInstanceId that is used in RIC indication msgs
-            self.my_subscriptions[E2EventInstanceId]= self.my_subscriptions.pop(SubscriptionId)
+        with self.subscription_lock:
+            if SubscriptionId in self.my_subscriptions:
+                self.my_subscriptions[SubscriptionId].e2_event_instance_id = E2EventInstanceId
+                # update the key, as it is more convenient to use E2EventInstanceId that is used in RIC indication msgs
+                self.my_subscriptions[E2EventInstanceId]= self.my_subscriptions.pop(SubscriptionId)
 
         response = self._create_http_response()
         response['payload'] = ("{}")
         return response
 
-    def subscribe(self, e2_node_id, ran_function_id, event_trigger_def, action_def, indication_callback, e2sm_type=e2sm_types.E2SM_UNKNOWN):
+    def subscribe(self, e2_node_id, ran_function_id, event_trigger_def, action_def, indication_callback, e2sm_type=e2sm_types.E2SM_UNKNOWN, batch_indications=False, lazy_indications=False, timeout=None):
+        # Identical requests (same E2 node, RAN function, event trigger and action definition, E2SM type and
+        # lazy mode) share one E2 subscription: indications are decoded once and passed to all callbacks.
+        # All of them get the same subscription ID, the E2 subscription is deleted when the last one unsubscribes.
+        lazy_indications = lazy_indications and e2sm_type == e2sm_types.E2SM_KPM
+        registry_key = (e2_node_id, ran_function_id, bytes(event_trigger_def), bytes(action_def), e2sm_type, lazy_indications)
+        consumer = IndicationConsumer(indication_callback, batch_indications)
+        if self.share_subscriptions:
+            with self.subscription_lock:
+                subscriptionObj = self.shared_subscriptions.get(registry_key, None)
+                if subscriptionObj is not None:
+                    self._add_consumer(subscriptionObj, consumer)
+                    self.shared_subscription_hits += 1
+                    print("Reusing Subscription ID: {} ({} consumers)".format(subscriptionObj.subscription_id, len(subscriptionObj.consumers)))
+                    return subscriptionObj.subscription_id
+
         action_id = 1 # Now only 1 action in a Subscription Request
         # Need to transform byte data for the REST request
         action_def = [action_def[i] for i in range (0, len(action_def))]
@@ -106,7 +208,16 @@ class xAppBase(object):
 
         # Create and send RIC Subscription Request
         subReq = self.subscriber.SubscriptionParams(None, self.subEndPoint, e2_node_id, ran_function_id, None, [subsDetail])
-        data, reason, status  = self.subscriber.Subscribe(subReq)
+        if timeout is None:
+            data, reason, status  = self.subscriber.Subscribe(subReq)
+        else:
+            # Subscribe() has no timeout parameter, same request with the REST client's per-request timeout
+            response = self.subscriber.api.request(method="POST", url=self.subscriber.uri, headers=None, body=subReq.to_dict(),
+                                                   _request_timeout=(timeout, timeout))
+            data, reason, status = response.data, response.reason, response.status
+        if not 200 <= status <= 299:
+            # raised like the REST client's errors, subscribe_bulk reports it in the SubscriptionResult
+            raise ApiException(status=status, reason=reason)
 
         # Decode RIC Subscription Response
         subResponse = json.loads(data)
@@ -117,79 +228,493 @@ class xAppBase(object):
         subscriptionObj.e2sm_type = e2sm_type
         subscriptionObj.subscription_id = subscription_id
         subscriptionObj.callback_func = indication_callback
-        # Store active subscription in the dict
-        self.my_subscriptions[subscription_id] = subscriptionObj
+        subscriptionObj.batch_indications = batch_indications
+        # lazy indications: callback(e2_agent_id, subscription_id, indication), batch: callback(subscription_id, [(e2_agent_id, indication)])
+        subscriptionObj.lazy_indications = lazy_indications
+        subscriptionObj.registry_key = registry_key
+        subscriptionObj.consumers = [consumer]
+
+        with self.subscription_lock:
+            existing_subscriptionObj = self.shared_subscriptions.get(registry_key, None) if self.share_subscriptions else None
+            if existing_subscriptionObj is None:
+                if self.share_subscriptions:
+                    self.shared_subscriptions[registry_key] = subscriptionObj
+                # Store active subscription in the dict
+                self.my_subscriptions[subscription_id] = subscriptionObj
+            else:
+                # the same subscription was created concurrently by another thread, use that one
+                self._add_consumer(existing_subscriptionObj, consumer)
+                self.shared_subscription_hits += 1
+
+        if existing_subscriptionObj is not None:
+            self._delete_subscription(subscription_id)
+            return existing_subscriptionObj.subscription_id
+        return subscription_id
+
+    def _add_consumer(self, subscriptionObj, consumer):
+        # called with subscription_lock held, the lists are replaced (not modified) as the receive loop iterates them
+        subscriptionObj.consumers = subscriptionObj.consumers + [consumer]
+        self._update_delivery(subscriptionObj)
+
+    def _update_delivery(self, subscriptionObj):
+        if not subscriptionObj.fan_out:
+            # the fan-out function accepts both single and batch indications, so the callback is switched
+            # first and the receive loop never calls a consumer's callback in the wrong form
+            subscriptionObj.callback_func = functools.partial(self._fan_out_indications, subscriptionObj)
+            subscriptionObj.fan_out = True
+        # batches are kept if any consumer wants them, _fan_out_indications unrolls them for the other consumers
+        subscriptionObj.batch_indications = any(consumer.batch_indications for consumer in subscriptionObj.consumers)
+
+    def _fan_out_indications(self, subscriptionObj, *args):
+        # args: (subscription_id, [(e2_agent_id, ...)]) for batches or (e2_agent_id, subscription_id, ...)
+        if len(args) == 2:
+            subscription_id, indications = args
+        else:
+            subscription_id = args[1]
+            indications = [(args[0],) + args[2:]]
+
+        for consumer in subscriptionObj.consumers:
+            if consumer.callback_func is None:
+                continue
+            try:
+                if consumer.batch_indications:
+                    consumer.callback_func(subscription_id, indications)
+                else:
+                    for indication in indications:
+                        consumer.callback_func(indication[0], subscription_id, *indication[1:])
+            except Exception as e:
+                print("Error in RIC indication callback: {}".format(e))
 
-    def unsubscribe(self, subscription_id):
+    def _find_subscription(self, subscription_id):
+        # returns the (my_subscriptions key, SubscriptionWrapper) of the subscription ID
+        for key, subscriptionObj in self.my_subscriptions.items():
+            if subscriptionObj.subscription_id == subscription_id:
+                return key, subscriptionObj
+        return None, None
+
+    def _delete_subscription(self, subscription_id, timeout=None):
+        # returns the HTTP status, REST client errors (e.g. timeout, 404) are raised
         print("Unsubscribe Subscription ID: ", subscription_id)
-        data, reason, status  = self.subscriber.UnSubscribe(subscription_id)
+        if timeout is None:
+            data, reason, status  = self.subscriber.UnSubscribe(subscription_id)
+        else:
+            response = self.subscriber.api.request(method="DELETE", url=self.subscriber.uri + "/subscriptions/" + subscription_id, headers=None,
+                                                   _request_timeout=(timeout, timeout))
+            status = response.status
         if (status == 204):
             print("Successfully unsubscribed from Subscription ID: ", subscription_id)
         else:
             print("Error during unsubscribing from Subscription ID: ", subscription_id)
+        return status
+
+    def unsubscribe(self, subscription_id, indication_callback=None, timeout=None):
+        # Removes the consumer with the given callback from the subscription, the E2 subscription is deleted
+        # when no consumer is left. The callback is required if the subscription is shared by several consumers,
+        # ValueError is raised if it is missing or matches none of them.
+        with self.subscription_lock:
+            key, subscriptionObj = self._find_subscription(subscription_id)
+            if subscriptionObj is not None and len(subscriptionObj.consumers) > 1:
+                if indication_callback is None:
+                    raise ValueError("Subscription ID {} is shared by {} consumers, the indication callback to remove is required".format(
+                                     subscription_id, len(subscriptionObj.consumers)))
+                consumers = list(subscriptionObj.consumers)
+                for idx in range(len(consumers) - 1, -1, -1):
+                    callback_func = consumers[idx].callback_func
+                    # callbacks wrapped by e.g. AsyncXAppBase keep the original in __wrapped__
+                    if getattr(callback_func, '__wrapped__', callback_func) == indication_callback:
+                        del consumers[idx]
+                        break
+                else:
+                    raise ValueError("Indication callback is not a consumer of Subscription ID {}".format(subscription_id))
+                subscriptionObj.consumers = consumers
+                self._update_delivery(subscriptionObj)
+                print("Subscription ID: {} still used by {} consumers".format(subscription_id, len(consumers)))
+                return
+
+            if subscriptionObj is not None:
+                del self.my_subscriptions[key]
+                if self.shared_subscriptions.get(subscriptionObj.registry_key, None) is subscriptionObj:
+                    del self.shared_subscriptions[subscriptionObj.registry_key]
+        self._delete_subscription(subscription_id, timeout)
+
+    def _bulk_max_parallel(self, max_parallel):
+        # by default as many requests in parallel as the REST client keeps connections alive
+        if max_parallel is None:
+            max_parallel = getattr(self.subscriber.api.configuration, 'connection_pool_maxsize', None) or 4
+        return max(1, max_parallel)
+
+    def _run_bulk(self, func, items, max_parallel):
+        # calls func(item) for all items with bounded parallelism, returns a list of (result, error) in input order
+        def call(item):
+            try:
+                return func(item), None
+            except Exception as e:
+                return None, e
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self._bulk_max_parallel(max_parallel), len(items)), thread_name_prefix="submgr-rest") as executor:
+            return list(executor.map(call, items))
+
+    def subscribe_bulk(self, e2_node_ids, ran_function_id, event_trigger_def, action_def, indication_callback, e2sm_type=e2sm_types.E2SM_UNKNOWN,
+                       batch_indications=False, lazy_indications=False, max_parallel=None, timeout=10):
+        # Subscribes to the same event trigger and action definition on all E2 nodes, max_parallel requests at a time
+        # over the REST client's keep-alive connections. Returns a SubscriptionResult per E2 node, in input order.
+        def subscribe_node(e2_node_id):
+            # explicitly the blocking subscribe, subclasses like AsyncXAppBase override it with a coroutine
+            return xAppBase.subscribe(self, e2_node_id, ran_function_id, event_trigger_def, action_def, indication_callback, e2sm_type,
+                                      batch_indications, lazy_indications, timeout)
+        e2_node_ids = list(e2_node_ids)
+        results = self._run_bulk(subscribe_node, e2_node_ids, max_parallel)
+        for e2_node_id, (subscription_id, error) in zip(e2_node_ids, results):
+            if error is not None:
+                print("Error during subscribing to E2 node ID: {}: {}".format(e2_node_id, error))
+        return [SubscriptionResult(e2_node_id, subscription_id, error) for e2_node_id, (subscription_id, error) in zip(e2_node_ids, results)]
+
+    def unsubscribe_bulk(self, subscription_ids, max_parallel=None, timeout=10):
+        # Concurrent unsubscribe (see unsubscribe), returns a SubscriptionResult per subscription ID, in input order
+        def unsubscribe_one(subscription_id):
+            return self.unsubscribe(subscription_id, None, timeout)
+        subscription_ids = list(subscription_ids)
+        with self.subscription_lock:
+            e2_node_ids = {}
+            for subscriptionObj in self.my_subscriptions.values():
+                e2_node_ids[subscriptionObj.subscription_id] = subscriptionObj.registry_key[0]
+        results = self._run_bulk(unsubscribe_one, subscription_ids, max_parallel)
+        return [SubscriptionResult(e2_node_ids.get(subscription_id, None), subscription_id, error) for subscription_id, (_, error) in zip(subscription_ids, results)]
+
+    def unsubscribe_all(self, max_parallel=None, timeout=10):
+        with self.subscription_lock:
+            subscriptions = list(self.my_subscriptions.values())
+            self.my_subscriptions.clear()
+            self.shared_subscriptions.clear()
+        results = self._run_bulk(lambda subscriptionObj: self._delete_subscription(subscriptionObj.subscription_id, timeout), subscriptions, max_parallel)
+        for subscriptionObj, (status, error) in zip(subscriptions, results):
+            if error is not None:
+                print("Error during unsubscribing from Subscription ID: {}: {}".format(subscriptionObj.subscription_id, error))
+
+    def get_subscription_stats(self):
+        with self.subscription_lock:
+            return {'subscriptions': len(self.my_subscriptions),
+                    'consumers': sum(len(subscriptionObj.consumers) for subscriptionObj in self.my_subscriptions.values()),
+                    'shared_subscription_hits': self.shared_subscription_hits}
+
+    def enable_indication_workers(self, num_workers=4, queue_size=1000, policy=overflow_policy.BLOCK):
+        # Opt-in: the RMR receive loop only queues RIC indications, decoding and callbacks run in worker threads.
+        # Indications of the same subscription are always handled by the same worker, i.e. in order.
+        # Has to be called before the xApp is started.
+        self.indication_dispatcher = IndicationDispatcher(num_workers, queue_size, policy)
+
+    def get_indication_dispatch_stats(self):
+        if self.indication_dispatcher is None:
+            return None
+        return self.indication_dispatcher.get_stats()
+
+    def enable_batch_receive(self, max_batch_size=64, max_batch_wait_ms=10):
+        # Opt-in: after each wake-up the receive loop drains all immediately available RMR messages
+        # (up to max_batch_size messages or max_batch_wait_ms) before handling the RIC indications.
+        # Subscriptions created with batch_indications=True get all their indications of a batch in one callback.
+        self.batch_receive = True
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_wait_ms = max_batch_wait_ms
+
+    def enable_kpm_decode_pool(self, num_workers=None, max_pending=1000):
+        # Opt-in: E2SM-KPM indication header/message decoding is done in num_workers processes (default: CPU count).
+        # Indications are sharded by E2 node ID. Callbacks and KPM sinks of these indications are called from
+        # the pool's delivery thread, in the order the indications were received.
+        self.kpm_decode_pool = KpmDecodePool(num_workers, max_pending)
+
+    def add_kpm_sink(self, sink):
+        # sink(e2_agent_id, subscription_id, indication_hdr, indication_msg) is called with every decoded
+        # E2SM-KPM indication before the subscription's callback, from the thread running the callback.
+        self.kpm_sinks.append(sink)
+
+    def enable_meas_store(self, capacity=1024, dtype='float64'):
+        # Opt-in: keeps the last capacity samples per (E2 node, UE, metric) in NumPy ring buffers (requires numpy).
+        if self.meas_store is None:
+            self.meas_store = KpmMeasStore(capacity, dtype)
+            self.add_kpm_sink(self.meas_store.on_indication)
+        return self.meas_store
+
+    def enable_kpm_aggregates(self, window_ms=10000, max_samples=None, ewma_alpha=0.1):
+        # Opt-in: sliding-window count/sum/min/max/EWMA/quantiles per (E2 node, UE, metric) and per (E2 node, metric),
+        # updated with every decoded E2SM-KPM indication.
+        if self.kpm_aggregator is None:
+            self.kpm_aggregator = KpmAggregator(window_ms, max_samples, ewma_alpha)
+            self.add_kpm_sink(self.kpm_aggregator.on_indication)
+        return self.kpm_aggregator
 
-    def unsubscribe_all(self):
-        for e2_event_instance_id, subscriptionObj in self.my_subscriptions.items():
-            self.unsubscribe(subscriptionObj.subscription_id)
+    def _feed_kpm_sinks(self, e2_agent_id, subscription_id, indication_hdr, indication_msg):
+        for sink in self.kpm_sinks:
+            try:
+                sink(e2_agent_id, subscription_id, indication_hdr, indication_msg)
+            except Exception as e:
+                print("Error in E2SM-KPM indication sink: {}".format(e))
 
     def rmr_send(self, e2_node_id, payload, mtype, retries=1):
-        sbuf = rmr.rmr_alloc_msg(self.rmr_client, len(payload), mtype=mtype)
+        # Returns the RMR state of the send, i.e. 0 (RMR_OK) on success.
+        sbuf = self.rmr_send_pool.get(len(payload))
         rmr.set_payload_and_length(payload, sbuf)
         rmr.generate_and_set_transaction_id(sbuf)
-        sbuf.contents.state = 0
         sbuf.contents.mtype = mtype
         sbuf.contents.sub_id = -1
         rmr.rmr_set_meid(sbuf, e2_node_id.encode("utf8"))
         #print("Pre send summary: {}".format(rmr.message_summary(sbuf)))
-        sbuf = rmr.rmr_send_msg(self.rmr_client, sbuf)
 
-    def _run(self):
-        while self.running:
+        attempt = 0
+        while True:
+            sbuf.contents.state = 0
+            sbuf = rmr.rmr_send_msg(self.rmr_client, sbuf)
+            state = sbuf.contents.state
+            if state != rmr.RMR_ERR_RETRY or attempt >= retries:
+                break
+            # transient failure (e.g. endpoint busy), retry with bounded exponential backoff
+            attempt += 1
+            time.sleep(min(0.001 * (2 ** attempt), 0.1))
+
+        with self.rmr_send_lock:
+            self.rmr_send_stats['retries'] += attempt
+            if state == rmr.RMR_OK:
+                self.rmr_send_stats['sent'] += 1
+            else:
+                self.rmr_send_stats['failed'] += 1
+
+        if state != rmr.RMR_OK:
+            print("Error during RMR send to E2 node ID: {}, state: {}".format(e2_node_id, rmr.state_to_status(state)))
+
+        self.rmr_send_pool.put(sbuf)
+        return state
+
+    def get_rmr_send_stats(self):
+        with self.rmr_send_lock:
+            return dict(self.rmr_send_stats)
+
+    def _decode_ric_indication(self, subscriptionObj, data):
+        ric_indication = IndicationMsg()
+        ric_indication.decode(data)
+        if (subscriptionObj.e2sm_type == e2sm_types.E2SM_KPM):
+            # if RIC Indication from E2SM_KPM then decode
+            return self.e2sm_kpm.unpack_ric_indication(ric_indication)
+        # in other cases just pass undecoded byte data
+        return ric_indication.indication_header, ric_indication.indication_message
+
+    @staticmethod
+    def _split_ric_indication(data):
+        ric_indication = IndicationMsg()
+        ric_indication.decode(data)
+        return ric_indication.indication_header, ric_indication.indication_message
+
+    def _handle_lazy_kpm_indications(self, subscription_id, subscriptionObj, indications, feed_sinks):
+        # nothing is decoded here unless a sink needs it, the callback decodes what it accesses
+        callback_func = subscriptionObj.callback_func
+        lazy_indications = []
+        for e2_agent_id, data in indications:
+            indication = LazyKpmIndication(self.e2sm_kpm, data, self._split_ric_indication)
+            if feed_sinks:
+                try:
+                    indication_hdr, indication_msg = indication.indication_hdr, indication.indication_msg
+                except Exception as e:
+                    print("Error during RIC indication decoding: {}".format(e))
+                    continue
+                self._feed_kpm_sinks(e2_agent_id, subscription_id, indication_hdr, indication_msg)
+            if callback_func is None:
+                continue
+            if subscriptionObj.batch_indications:
+                lazy_indications.append((e2_agent_id, indication))
+            else:
+                try:
+                    callback_func(e2_agent_id, subscription_id, indication)
+                except Exception as e:
+                    print("Error in RIC indication callback: {}".format(e))
+
+        if lazy_indications:
             try:
-                sbuf = rmr.rmr_torcv_msg(self.rmr_client, None, 100)
-                summary = rmr.message_summary(sbuf)
+                callback_func(subscription_id, lazy_indications)
             except Exception as e:
+                print("Error in RIC indication callback: {}".format(e))
+
+    def _handle_ric_indications(self, subscription_id, indications):
+        # indications: list of (e2_agent_id, payload) tuples received for the subscription
+        subscriptionObj = self.my_subscriptions.get(subscription_id, None)
+        if subscriptionObj is None:
+            return
+        feed_sinks = len(self.kpm_sinks) > 0 and subscriptionObj.e2sm_type == e2sm_types.E2SM_KPM
+        if subscriptionObj.callback_func is None and not feed_sinks:
+            return
+
+        if subscriptionObj.lazy_indications:
+            self._handle_lazy_kpm_indications(subscription_id, subscriptionObj, indications, feed_sinks)
+            return
+
+        if self.kpm_decode_pool is not None and subscriptionObj.e2sm_type == e2sm_types.E2SM_KPM:
+            self._handle_kpm_indications_in_pool(subscription_id, subscriptionObj, indications)
+            return
+
+        callback_func = subscriptionObj.callback_func
+        decoded_indications = []
+        for e2_agent_id, data in indications:
+            try:
+                indication_hdr, indication_msg = self._decode_ric_indication(subscriptionObj, data)
+            except Exception as e:
+                print("Error during RIC indication decoding: {}".format(e))
                 continue
 
-            if summary[rmr.RMR_MS_MSG_STATE] == 0: # RMR_OK
-                # Check if RIC INDICATION message
-                if (summary['message type'] == 12050):
-                    e2_agent_id = str(summary['meid'].decode('utf-8'))
+            if feed_sinks:
+                self._feed_kpm_sinks(e2_agent_id, subscription_id, indication_hdr, indication_msg)
+            if callback_func is None:
+                continue
+            if subscriptionObj.batch_indications:
+                decoded_indications.append((e2_agent_id, indication_hdr, indication_msg))
+            else:
+                try:
+                    callback_func(e2_agent_id, subscription_id, indication_hdr, indication_msg)
+                except Exception as e:
+                    print("Error in RIC indication callback: {}".format(e))
+
+        if decoded_indications:
+            try:
+                callback_func(subscription_id, decoded_indications)
+            except Exception as e:
+                print("Error in RIC indication callback: {}".format(e))
+
+    def _kpm_indication_decoded(self, callback_func, e2_agent_id, subscription_id, decoded, error):
+        # called from the decode pool's delivery thread
+        if error is not None:
+            print("Error during RIC indication decoding: {}".format(error))
+            return
+        indication_hdr, indication_msg = decoded
+        self._feed_kpm_sinks(e2_agent_id, subscription_id, indication_hdr, indication_msg)
+        if callback_func is None:
+            return
+        try:
+            callback_func(e2_agent_id, subscription_id, indication_hdr, indication_msg)
+        except Exception as e:
+            print("Error in RIC indication callback: {}".format(e))
+
+    def _kpm_batch_indication_decoded(self, decoded_indications, e2_agent_id, subscription_id, decoded, error):
+        if error is not None:
+            print("Error during RIC indication decoding: {}".format(error))
+            return
+        indication_hdr, indication_msg = decoded
+        self._feed_kpm_sinks(e2_agent_id, subscription_id, indication_hdr, indication_msg)
+        decoded_indications.append((e2_agent_id, indication_hdr, indication_msg))
+
+    def _kpm_batch_decoded(self, callback_func, subscription_id, decoded_indications):
+        if not decoded_indications:
+            return
+        try:
+            callback_func(subscription_id, decoded_indications)
+        except Exception as e:
+            print("Error in RIC indication callback: {}".format(e))
+
+    def _handle_kpm_indications_in_pool(self, subscription_id, subscriptionObj, indications):
+        # Neither the callbacks nor the sinks run here or on the executors' threads, the pool's delivery
+        # thread calls them once decoded, so the receive loop never waits for decoding.
+        callback_func = subscriptionObj.callback_func
+        batch = subscriptionObj.batch_indications and callback_func is not None
+        decoded_indications = []
+        for e2_agent_id, data in indications:
+            if batch:
+                # batch callbacks get all indications of the batch at once
+                delivery = functools.partial(self._kpm_batch_indication_decoded, decoded_indications, e2_agent_id, subscription_id)
+            else:
+                delivery = functools.partial(self._kpm_indication_decoded, callback_func, e2_agent_id, subscription_id)
+            try:
+                ric_indication = IndicationMsg()
+                ric_indication.decode(data)
+                # E2 node ID is the shard key
+                self.kpm_decode_pool.submit(e2_agent_id, ric_indication.indication_header, ric_indication.indication_message, delivery)
+            except Exception as e:
+                print("Error during RIC indication decoding: {}".format(e))
+
+        if batch:
+            self.kpm_decode_pool.call_after_deliveries(functools.partial(self._kpm_batch_decoded, callback_func, subscription_id, decoded_indications))
+
+    def _handle_ric_control_outcome(self, data, success):
+        try:
+            request_id = parse_ric_request_id(data)
+        except Exception as e:
+            print("Error during RIC control outcome decoding: {}".format(e))
+            request_id = None
+
+        if request_id is None:
+            print("Received {}".format("RIC_CONTROL_ACK" if success else "RIC_CONTROL_FAILURE"))
+            return
+        requestor_id, instance_id = request_id
+        print("Received {} for requestor ID: {}".format("RIC_CONTROL_ACK" if success else "RIC_CONTROL_FAILURE", requestor_id))
+        self.control_tracker.resolve(requestor_id, success, instance_id)
+
+    def _resend_control_request(self, e2_node_id, payload):
+        return self.rmr_send(e2_node_id, payload, 12040, retries=1)
+
+    def get_control_stats(self):
+        # outstanding/acked/failed/timed out RIC control requests and round-trip latency histogram
+        return self.control_tracker.get_stats()
+
+    def _receive_rmr_msg(self, timeout_ms, indications):
+        # Receives one RMR message, RIC indications of own subscriptions are added to the indications dict
+        # (subscription ID -> list of (e2_agent_id, payload)). Returns False if nothing was received.
+        try:
+            sbuf = rmr.rmr_torcv_msg(self.rmr_client, None, timeout_ms)
+            # read only the header fields, rmr.message_summary would also copy the payload
+            msg_state = sbuf.contents.state
+            msg_type = sbuf.contents.mtype
+        except Exception as e:
+            return False
+
+        if msg_state == 0: # RMR_OK
+            # Check if RIC INDICATION message
+            if (msg_type == 12050):
+                E2EventInstanceId = sbuf.contents.sub_id
+                # RIC indications are routed to all xApps, drop the ones not belonging
+                # to our subscriptions before copying the payload or decoding anything
+                if E2EventInstanceId not in self.my_subscriptions:
+                    self.filtered_indications += 1
+                else:
+                    e2_agent_id = rmr.rmr_get_meid(sbuf).decode('utf-8')
                     data = rmr.get_payload(sbuf)
-                    try:
-                        E2EventInstanceId = summary['subscription id']
-                        ric_indication = IndicationMsg()
-                        ric_indication.decode(data)
-                        subscriptionObj = self.my_subscriptions.get(E2EventInstanceId, None)
-                        if subscriptionObj is None:
-                            rmr.rmr_free_msg(sbuf)
-                            continue
-
-                        callback_func =  subscriptionObj.callback_func
-                        subscription_id = E2EventInstanceId
-                        if callback_func is not None:
-                            if (subscriptionObj.e2sm_type == e2sm_types.E2SM_KPM):
-                                # if RIC Indication from E2SM_KPM then decode
-                                indication_hdr, indication_msg = self.e2sm_kpm.unpack_ric_indication(ric_indication)
-                                callback_func(e2_agent_id, subscription_id, indication_hdr, indication_msg)
-                            else:
-                                # in other cases just pass undecoded byte data
-                                callback_func(e2_agent_id, subscription_id, ric_indication.indication_header, ric_indication.indication_message)
-                    except Exception as e:
-                        print("Error during RIC indication decoding: {}".format(e))
-                        pass
-                if (summary['message type'] == 12041):
-                    print("Received RIC_CONTROL_ACK")
-                if (summary['message type'] == 12042):
-                    print("Received RIC_CONTROL_FAILURE")
-
-            rmr.rmr_free_msg(sbuf)
+                    indications.setdefault(E2EventInstanceId, []).append((e2_agent_id, data))
+            if (msg_type == 12041 or msg_type == 12042):
+                self._handle_ric_control_outcome(rmr.get_payload(sbuf), msg_type == 12041)
+
+        rmr.rmr_free_msg(sbuf)
+        return msg_state == 0
+
+    def _run(self):
+        if self.indication_dispatcher is not None:
+            self.indication_dispatcher.start()
+
+        while self.running:
+            indications = {}
+            received = self._receive_rmr_msg(100, indications)
+            # time out (or re-send) RIC control requests without ACK/FAILURE
+            self.control_tracker.expire()
+            if not received:
+                continue
+
+            if self.batch_receive:
+                # drain all messages that are already waiting
+                deadline = time.monotonic() + self.max_batch_wait_ms / 1000.0
+                for _ in range(self.max_batch_size - 1):
+                    if time.monotonic() > deadline or not self._receive_rmr_msg(0, indications):
+                        break
+
+            for subscription_id, subscription_indications in indications.items():
+                if self.indication_dispatcher is not None:
+                    # keyed by subscription ID to keep per-subscription ordering
+                    self.indication_dispatcher.dispatch(subscription_id, self._handle_ric_indications, subscription_id, subscription_indications)
+                else:
+                    self._handle_ric_indications(subscription_id, subscription_indications)
 
     def stop(self):
         self.unsubscribe_all()
         self.httpServer.stop()
+        self.rmr_send_pool.free_all()
         rmr.rmr_close(self.rmr_client)
         self.running = False
+        if (self.indication_dispatcher is not None):
+            self.indication_dispatcher.stop()
+        if (self.kpm_decode_pool is not None):
+            self.kpm_decode_pool.shutdown(wait=False)
         if (self.xapp_thread is not None):
             self.xapp_thread.join()
         sys.exit(0)